@@ -0,0 +1,110 @@
+import hashlib
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from .caching import get_generations
+from .feed import as_posts, follow_feed
+from .models import Group, Post, User
+from .paginator import PREVIOUS, CursorPaginator, InvalidCursor
+
+
+def _image(post):
+    image = post.thumbnail or post.image
+    return image.url if image else None
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'comments': post.comment_count,
+        'image': _image(post),
+        'url': reverse('post', args=[post.author.username, post.pk]),
+    }
+
+
+def _etag(cursor, posts):
+    # Правка поста или новый комментарий меняют поколение ленты автора,
+    # поэтому текст страницы проверять не нужно.
+    authors = sorted({post.author_id for post in posts})
+    generations = get_generations(*(f'profile:{pk}' for pk in authors))
+    ids = [post.pk for post in posts]
+    raw = f'{cursor}|{ids}|{authors}|{generations}'
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def feed_response(request, posts, tiebreak='pk', private=False):
+    """Страница ленты в JSON с курсорами и условным GET.
+
+    ``next`` — курсор к более старым постам, ``previous`` — к новым:
+    клиент опрашивает ленту с ним, и каждый опрос — один запрос по
+    индексу. ETag зависит от постов страницы и поколений лент их
+    авторов; при совпадении If-None-Match отвечаем 304 без сериализации.
+    Last-Modified (самая новая дата публикации) только справочный:
+    правка или комментарий его не меняют, поэтому If-Modified-Since
+    не проверяется.
+    """
+    paginator = CursorPaginator(posts, settings.QUANTITY_PAGE,
+                                tiebreak=tiebreak)
+    cursor = request.GET.get('cursor') or None
+    try:
+        page = paginator.cursor_page(cursor)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Некорректный курсор'}, status=400)
+    rows = page.object_list
+    posts = as_posts(rows)
+    etag = _etag(cursor, posts)
+    # HTTP-даты с точностью до секунды.
+    last_modified = (int(max(post.pub_date for post in posts).timestamp())
+                     if posts else None)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        # Пустая страница оставляет клиенту тот же курсор для опроса.
+        previous = (paginator.encode_cursor(PREVIOUS, rows[0])
+                    if rows else cursor)
+        response = JsonResponse(
+            {'results': [serialize_post(post) for post in posts],
+             'next': page.next_cursor, 'previous': previous},
+            json_dumps_params={'ensure_ascii': False,
+                               'separators': (',', ':')})
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    cache_control = {'max_age': 0}
+    cache_control['private' if private else 'public'] = True
+    patch_cache_control(response, **cache_control)
+    return response
+
+
+@require_safe
+def index(request):
+    return feed_response(request, Post.objects.for_feed())
+
+
+@require_safe
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(request, group.posts.for_feed())
+
+
+@require_safe
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return feed_response(request, author.posts.for_feed())
+
+
+@require_safe
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Нужна авторизация'}, status=401)
+    posts, tiebreak = follow_feed(request.user)
+    return feed_response(request, posts, tiebreak, private=True)
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', api.index, name='index'),
+    path('group/<slug>/', api.group_posts, name='group_posts'),
+    path('profile/<str:username>/', api.profile, name='profile'),
+    path('follow/', api.follow_index, name='follow_index'),
+]
@@ -0,0 +1,162 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from yatube.db_router import use_primary
+
+
+CARD_TEMPLATE = 'includes/post_item.html'
+EDIT_BUTTON_TEMPLATE = 'includes/post_edit_button.html'
+EDIT_BUTTON_MARKER = '<!-- post-edit-button -->'
+
+
+def _generation_key(feed):
+    return f'feed_generation:{feed}'
+
+
+def _initial_generation():
+    # Растёт со временем: после вытеснения счётчика из кэша новые ключи
+    # не совпадут со старыми страницами.
+    return int(time.time() * 1000)
+
+
+def get_generations(*feeds):
+    """Текущие поколения лент; отсутствующие заводятся заново."""
+    keys = [_generation_key(feed) for feed in feeds]
+    found = cache.get_many(keys)
+    generations = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_generation(), None)
+            found[key] = cache.get(key)
+        generations.append(found[key])
+    return generations
+
+
+def bump_generations(*feeds):
+    """Сбросить закэшированные страницы лент, сменив их поколение."""
+    for feed in set(feeds):
+        key = _generation_key(feed)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+
+
+def invalidate(*feeds):
+    """Сменить поколение сразу и ещё раз после коммита транзакции.
+
+    Второй сброс убирает страницы, которые параллельный запрос успел
+    закэшировать по данным до коммита.
+    """
+    bump_generations(*feeds)
+    transaction.on_commit(lambda: bump_generations(*feeds))
+
+
+def post_feeds(author_id, *group_ids):
+    """Ленты, в которых показывается пост автора из этих групп."""
+    feeds = ['index', f'profile:{author_id}']
+    feeds += [f'group:{group_id}' for group_id in group_ids if group_id]
+    return feeds
+
+
+def page_cache_key(request, feed):
+    generation, = get_generations(feed)
+    user = request.user
+    viewer = f'user{user.pk}' if user.is_authenticated else 'anon'
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'feed_page:{feed}:{generation}:{viewer}:{path}'
+
+
+def page_etag(request, *feeds):
+    """ETag страницы: поколения её лент, зритель и его CSRF-cookie.
+
+    Токен в формах выводится из CSRF-cookie: после её смены (например,
+    при новом входе) браузер должен получить страницу заново.
+    """
+    generations = get_generations(*feeds)
+    user = request.user
+    viewer = f'user{user.pk}' if user.is_authenticated else 'anon'
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    raw = f'{feeds}|{generations}|{viewer}|{csrf}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def cache_feed_page(feed, timeout=None):
+    """Кэш страницы ленты до смены её поколения.
+
+    Анонимы получают общую копию, авторизованные — свою: в разметке
+    есть имя пользователя и кнопки редактирования его постов. Страницу
+    при промахе рендерит один запрос, остальные ждут его (get_or_set).
+    Рендер для кэша читает с основной базы: страница, собранная
+    с отстающей реплики, пережила бы смену поколения.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            rendered = []
+
+            def render():
+                with use_primary():
+                    response = view(request, *args, **kwargs)
+                rendered.append(response)
+                if response.status_code == 200 and not response.cookies:
+                    return response
+                return None
+
+            response = cache.get_or_set(
+                page_cache_key(request, feed), render,
+                timeout or settings.FEED_CACHE_TIMEOUT)
+            return response if response is not None else rendered[0]
+        return wrapper
+    return decorator
+
+
+def post_card_key(post):
+    """Ключ карточки: id поста и отпечаток всего, что в ней показано.
+
+    Правка текста или картинки, новый комментарий, смена или
+    переименование группы и готовая миниатюра меняют отпечаток, так что
+    устаревшая карточка просто перестаёт запрашиваться.
+    """
+    group = (post.group.slug, post.group.title) if post.group_id else None
+    raw = repr((post.text, post.pub_date, post.author.username, group,
+                post.comment_count, str(post.image), str(post.thumbnail),
+                post.variants))
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'post_card:{post.pk}:{digest}'
+
+
+def render_post_cards(posts, user):
+    """Разметка карточек постов; кэш общий для всех зрителей.
+
+    Кнопку редактирования карточка содержит как метку, вместо которой
+    автор поста получает ссылку, а остальные — пустую строку.
+    """
+    posts = list(posts)
+    keys = [post_card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            missing[key] = render_to_string(CARD_TEMPLATE, {
+                'post': post, 'edit_button': mark_safe(EDIT_BUTTON_MARKER)})
+    if missing:
+        cache.set_many(missing, settings.FEED_CACHE_TIMEOUT)
+        cards.update(missing)
+    viewer = user.pk if user is not None and user.is_authenticated else None
+    html = []
+    for key, post in zip(keys, posts):
+        button = ''
+        if post.author_id == viewer:
+            button = render_to_string(EDIT_BUTTON_TEMPLATE, {'post': post})
+        html.append(cards[key].replace(EDIT_BUTTON_MARKER, button))
+    return mark_safe(''.join(html))
@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import FeedEntry, Follow, Post, UserStats
+
+
+def is_celebrity(author_id):
+    """Посты авторов с огромной аудиторией читаются, а не раскладываются."""
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_LIMIT).exists()
+
+
+def _entries(user_ids, posts):
+    return [
+        FeedEntry(user_id=user_id, post_id=post.pk,
+                  author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in user_ids for post in posts
+    ]
+
+
+def fan_out(post):
+    """Разложить новый пост по лентам подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True)
+    # Размер пачки не задаём: Django 2.2 не ограничит его лимитом SQLite.
+    FeedEntry.objects.bulk_create(_entries(followers.iterator(), [post]),
+                                  ignore_conflicts=True)
+
+
+def backfill(follow):
+    """Добавить в ленту подписчика последние посты нового автора."""
+    if is_celebrity(follow.author_id):
+        return
+    posts = Post.objects.filter(author_id=follow.author_id).only(
+        'pk', 'author_id', 'pub_date')[:settings.FEED_BACKFILL_LIMIT]
+    FeedEntry.objects.bulk_create(_entries([follow.user_id], posts),
+                                  ignore_conflicts=True)
+
+
+def rebuild(author_ids):
+    """Заполнить ленты подписчиков этих авторов одним INSERT на автора.
+
+    Для массовой загрузки данных, когда сигналы не срабатывали.
+    """
+    ops = connection.ops
+    entry, post, follow = (model._meta.db_table
+                           for model in (FeedEntry, Post, Follow))
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=True)} {entry} '
+        '(user_id, post_id, author_id, pub_date) '
+        'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+        f'FROM {follow} f, (SELECT id, author_id, pub_date FROM {post} '
+        'WHERE author_id = %s ORDER BY pub_date DESC, id DESC LIMIT %s) p '
+        'WHERE f.author_id = %s '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    with connection.cursor() as cursor:
+        for author_id in author_ids:
+            if not is_celebrity(author_id):
+                cursor.execute(sql, [author_id, settings.FEED_BACKFILL_LIMIT,
+                                     author_id])
+
+
+def restore_fan_out(author_id):
+    """Разложить посты автора, чья аудитория опустилась до предела.
+
+    Пока подписчиков было больше FEED_FANOUT_LIMIT, новые посты не
+    раскладывались, и без этого они пропали бы из лент. Счётчик
+    меняется под блокировкой строки, поэтому ровно одна отписка видит
+    его равным пределу.
+    """
+    followers = UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first()
+    if followers == settings.FEED_FANOUT_LIMIT:
+        rebuild([author_id])
+
+
+def prune(follow):
+    FeedEntry.objects.filter(user_id=follow.user_id,
+                             author_id=follow.author_id).delete()
+
+
+def follow_feed(user):
+    """Лента подписок и ключ курсора для CursorPaginator.
+
+    Обычно это диапазон по индексу (user, -pub_date) таблицы FeedEntry.
+    Посты «знаменитостей» в ленты не раскладываются и подмешиваются
+    при чтении.
+    """
+    celebrities = list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True))
+    if not celebrities:
+        entries = FeedEntry.objects.filter(user=user).select_related(
+            'post__author', 'post__group')
+        return entries, 'post_id'
+    inbox = FeedEntry.objects.filter(user=user).values('post_id')
+    posts = Post.objects.for_feed().filter(
+        Q(pk__in=inbox) | Q(author_id__in=celebrities))
+    return posts, 'pk'
+
+
+def as_posts(items):
+    return [item.post if isinstance(item, FeedEntry) else item
+            for item in items]
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from . import images
 from .models import Comment, Post
 
 
@@ -12,8 +14,21 @@ class PostForm(forms.ModelForm):
                   'image': 'Выберите картинку для поста'
                   }
 
+    def clean_image(self):
+        """Новая картинка проверяется по лимитам и перекодируется."""
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return images.reencode(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
+    """Комментарий к посту или ответ на комментарий parent."""
+
+    def __init__(self, *args, parent=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instance.parent = parent
+
     class Meta:
         model = Comment
         fields = ('text',)
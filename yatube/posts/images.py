@@ -0,0 +1,109 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, ImageSequence
+
+# Форматы, которые хранятся как есть, и параметры их перекодирования.
+SAVE_OPTIONS = {
+    'JPEG': {'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'GIF': {'optimize': True},
+    'WEBP': {'method': 6},
+}
+# Форматы, в которых анимация сохраняется; у остальных остаётся первый
+# кадр (например, стереопара MPO).
+ANIMATED_SAVE_OPTIONS = {
+    'GIF': {'disposal': 2},
+    'PNG': {},
+    'WEBP': {},
+}
+
+
+def check_limits(upload):
+    """Размер файла и число пикселей — до декодирования картинки.
+
+    Image.open читает только заголовок, поэтому «бомба» в несколько
+    килобайт с гигантскими размерами отсекается без выделения памяти.
+    """
+    if upload.size > settings.IMAGE_MAX_BYTES:
+        limit = settings.IMAGE_MAX_BYTES // 2 ** 20
+        raise ValidationError(f'Файл больше {limit} МБ')
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f'Картинка {width}×{height} слишком большая: не больше '
+            f'{settings.IMAGE_MAX_PIXELS // 10 ** 6} млн пикселей')
+    # Кадры анимации перекодируются все, лимит — на их сумму.
+    frames = getattr(image, 'n_frames', 1)
+    if width * height * frames > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f'Анимация {width}×{height} из {frames} кадров слишком '
+            f'большая: не больше {settings.IMAGE_MAX_PIXELS // 10 ** 6} '
+            f'млн пикселей во всех кадрах')
+    return image
+
+
+def fit_width(image):
+    if image.width <= settings.IMAGE_MAX_WIDTH:
+        return image
+    height = round(image.height * settings.IMAGE_MAX_WIDTH / image.width)
+    return image.resize((settings.IMAGE_MAX_WIDTH, height), Image.LANCZOS)
+
+
+def reencode_animation(image, name):
+    """Анимация, перекодированная по кадрам без метаданных.
+
+    Кадры сохраняются целиком (disposal=2 для GIF), длительности и
+    число повторов — как в исходнике.
+    """
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        # WebP заполняет info кадра только при загрузке.
+        frame.load()
+        durations.append(frame.info.get('duration', 100))
+        frame = fit_width(ImageOps.exif_transpose(frame).convert('RGBA'))
+        frame.info = {}
+        frames.append(frame)
+    buffer = BytesIO()
+    frames[0].save(buffer, image.format, save_all=True,
+                   append_images=frames[1:], duration=durations,
+                   loop=image.info.get('loop', 0),
+                   quality=settings.IMAGE_QUALITY,
+                   **SAVE_OPTIONS[image.format],
+                   **ANIMATED_SAVE_OPTIONS[image.format])
+    return ContentFile(buffer.getvalue(), name=name)
+
+
+def reencode(upload):
+    """Картинка поста без метаданных и не шире IMAGE_MAX_WIDTH.
+
+    Поворот из EXIF применяется к пикселям, а сами метаданные (EXIF с
+    геометкой, XMP, комментарии) при перекодировании не копируются.
+    JPEG, PNG, GIF и WebP остаются в своём формате и под своим именем,
+    остальные форматы перекодируются в IMAGE_FORMAT. Анимированные GIF,
+    PNG и WebP перекодируются по кадрам.
+    """
+    image = check_limits(upload)
+    name = os.path.basename(upload.name)
+    if (getattr(image, 'is_animated', False)
+            and image.format in ANIMATED_SAVE_OPTIONS):
+        return reencode_animation(image, name)
+    image_format = image.format
+    if image_format not in SAVE_OPTIONS:
+        image_format = settings.IMAGE_FORMAT
+        name = f'{os.path.splitext(name)[0]}.{image_format.lower()}'
+    image = ImageOps.exif_transpose(image)
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    image = fit_width(image)
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=settings.IMAGE_QUALITY,
+               **SAVE_OPTIONS[image_format])
+    return ContentFile(buffer.getvalue(), name=name)
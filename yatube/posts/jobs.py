@@ -0,0 +1,184 @@
+import json
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, connections, transaction
+from django.db.models import Avg, Count, Max, Q
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from yatube.instrumentation import paused
+from yatube.sqlite.transaction import atomic_write
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+REGISTRY = {}
+_executor = None
+
+
+def name_of(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def register(func):
+    """Разрешить очереди вызывать функцию по её полному имени."""
+    REGISTRY[name_of(func)] = func
+    return func
+
+
+def resolve(name):
+    # Модуль задачи мог ещё не импортироваться в процессе воркера.
+    if name not in REGISTRY:
+        import_string(name)
+    return REGISTRY[name]
+
+
+def enqueue(func, *args, on_commit=False):
+    """Поставить задачу в очередь вместе с текущей транзакцией.
+
+    Строка Job фиксируется тем же коммитом, что и сама запись, поэтому
+    задача не потеряется и не выполнится для отменённой записи. При
+    JOBS_EAGER очереди нет: задача выполняется сразу (или после
+    коммита, если on_commit) в этом же процессе, но её SQL не входит в
+    бюджет запроса.
+    """
+    name = name_of(func)
+    if REGISTRY.get(name) is not func:
+        raise ValueError(f'{name} не зарегистрирована как задача')
+    if settings.JOBS_EAGER:
+        if on_commit:
+            transaction.on_commit(lambda: run_eagerly(func, args))
+        else:
+            with paused():
+                func(*args)
+        return None
+    return Job.objects.create(name=name, args=json.dumps(args),
+                              run_after=timezone.now())
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.JOBS_EAGER_WORKERS,
+            thread_name_prefix='jobs')
+    return _executor
+
+
+@receiver(setting_changed)
+def reset(setting=None, **kwargs):
+    """Дождаться фоновых задач и остановить пул (для тестов и настроек)."""
+    global _executor
+    if setting not in (None, 'JOBS_EAGER_WORKERS', 'DATABASES'):
+        return
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def _run_logged(func, args):
+    # Запись уже закоммичена: сбой побочного эффекта не должен
+    # превращать успешный запрос в ошибку 500.
+    try:
+        with paused():
+            func(*args)
+    except Exception:
+        logger.exception('Задача %s упала', name_of(func))
+
+
+def _run_in_background(func, args):
+    try:
+        _run_logged(func, args)
+    finally:
+        connections.close_all()
+
+
+def run_eagerly(func, args):
+    """Задача после коммита без очереди: в фоновом пуле JOBS_EAGER_WORKERS.
+
+    Медленные эффекты (нарезка миниатюр) не задерживают ответ. При
+    JOBS_EAGER_WORKERS = 0 задача выполняется в потоке запроса.
+    """
+    if settings.JOBS_EAGER_WORKERS:
+        executor().submit(_run_in_background, func, args)
+    else:
+        _run_logged(func, args)
+
+
+def claim(limit):
+    """Забрать до limit готовых задач, продлив их аренду на JOB_TIMEOUT.
+
+    Задача упавшего воркера остаётся в статусе running и снова
+    становится доступной, когда аренда истекает.
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.JOB_TIMEOUT)
+    ready = Job.objects.filter(
+        Q(status=Job.PENDING) | Q(status=Job.RUNNING),
+        run_after__lte=now).order_by('run_after', 'pk')
+    if connection.features.has_select_for_update_skip_locked:
+        # Строки, которые уже забирает другой воркер, пропускаем.
+        ready = ready.select_for_update(skip_locked=True)
+    claimed = []
+    with atomic_write():
+        for job in ready[:limit]:
+            # Обновляем, только если задачу не забрали после нашего
+            # SELECT: тогда её статус или аренда уже другие.
+            updated = Job.objects.filter(
+                pk=job.pk, status=job.status, run_after=job.run_after,
+            ).update(status=Job.RUNNING, run_after=lease)
+            if updated:
+                claimed.append(job)
+    return claimed
+
+
+def run(job):
+    """Выполнить задачу и записать её время; при ошибке — повторить позже."""
+    started = time.perf_counter()
+    attempts = job.attempts + 1
+    try:
+        # Отметка о выполнении коммитится вместе с эффектами задачи:
+        # иначе сбой между ними повторил бы неидемпотентную задачу.
+        with atomic_write():
+            resolve(job.name)(*json.loads(job.args))
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.DONE, attempts=attempts, finished=timezone.now(),
+                duration=(time.perf_counter() - started) * 1000, error='')
+    except Exception:
+        logger.exception('Задача %s упала', job)
+        retry = attempts < settings.JOB_MAX_ATTEMPTS
+        # Пауза перед повтором растёт вдвое с каждой попыткой.
+        delay = settings.JOB_RETRY_DELAY * 2 ** (attempts - 1)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.PENDING if retry else Job.FAILED,
+            attempts=attempts, error=traceback.format_exc(),
+            run_after=timezone.now() + timedelta(seconds=delay),
+            duration=(time.perf_counter() - started) * 1000)
+        return False
+    return True
+
+
+def run_in_thread(job):
+    try:
+        return run(job)
+    finally:
+        connection.close()
+
+
+def stats():
+    """Число задач по статусам и время выполнения по именам задач."""
+    return list(Job.objects.order_by().values('name').annotate(
+        total=Count('pk'),
+        pending=Count('pk', filter=Q(status=Job.PENDING)),
+        failed=Count('pk', filter=Q(status=Job.FAILED)),
+        done=Count('pk', filter=Q(status=Job.DONE)),
+        avg_ms=Avg('duration', filter=Q(status=Job.DONE)),
+        max_ms=Max('duration', filter=Q(status=Job.DONE)),
+    ).order_by('name'))
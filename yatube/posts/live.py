@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class LocalBroker:
+    """Pub/sub внутри процесса: слушатели спят на Condition до события.
+
+    Последние LIVE_HISTORY событий хранятся, чтобы переподключившийся
+    клиент получил пропущенное по Last-Event-ID.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.events = deque(maxlen=settings.LIVE_HISTORY)
+        self.sequence = 0
+
+    def last_id(self):
+        return self.sequence
+
+    def publish(self, channel, data):
+        with self.condition:
+            self.sequence += 1
+            self.events.append((self.sequence, channel, data))
+            self.condition.notify_all()
+
+    def listen(self, channels, last_id, timeout):
+        """События каналов после last_id, дождавшись их не дольше timeout.
+
+        Возвращает события и новый last_id.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            if last_id > self.sequence:
+                # Номер из прошлой жизни брокера (перезапуск процесса):
+                # все события этой жизни клиент ещё не видел.
+                last_id = 0
+            while True:
+                events = [event for event in self.events
+                          if event[0] > last_id and event[1] in channels]
+                last_id = max(last_id, self.sequence)
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events, last_id
+                self.condition.wait(remaining)
+
+
+class CacheBroker:
+    """Журнал событий в общем кэше: его видят все воркеры.
+
+    Заменитель настоящего pub/sub между процессами (например, Redis):
+    слушатели раз в LIVE_POLL_INTERVAL читают номер последнего события
+    и забирают новые одним get_many.
+    """
+
+    SEQUENCE_KEY = 'live:sequence'
+
+    @property
+    def cache(self):
+        return caches[settings.LIVE_CACHE]
+
+    def last_id(self):
+        return self.cache.get(self.SEQUENCE_KEY) or 0
+
+    def publish(self, channel, data):
+        self.cache.add(self.SEQUENCE_KEY, 0, None)
+        sequence = self.cache.incr(self.SEQUENCE_KEY)
+        self.cache.set(f'live:event:{sequence}', (channel, data),
+                       settings.LIVE_STREAM_TIMEOUT * 2)
+
+    def listen(self, channels, last_id, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            sequence = self.last_id()
+            if last_id > sequence:
+                # Счётчик пропал из кэша и начался заново.
+                last_id = 0
+            if sequence > last_id:
+                first = max(last_id + 1, sequence - settings.LIVE_HISTORY + 1)
+                numbers = range(first, sequence + 1)
+                found = self.cache.get_many(
+                    [f'live:event:{number}' for number in numbers])
+                events = []
+                for number in numbers:
+                    event = found.get(f'live:event:{number}')
+                    if event is not None and event[0] in channels:
+                        events.append((number, *event))
+                last_id = sequence
+                if events:
+                    return events, last_id
+            if time.monotonic() >= deadline:
+                return [], last_id
+            time.sleep(settings.LIVE_POLL_INTERVAL)
+
+
+BROKERS = {'local': LocalBroker, 'cache': CacheBroker}
+
+
+@lru_cache(maxsize=None)
+def _broker(name):
+    return BROKERS[name]()
+
+
+def broker():
+    return _broker(settings.LIVE_BROKER)
+
+
+@receiver(setting_changed)
+def reset(setting=None, **kwargs):
+    # Брокер создаётся с настройками LIVE_*: после их смены — новый.
+    if setting is None or setting.startswith('LIVE_'):
+        _broker.cache_clear()
+
+
+def post_channels(author_id, group_id):
+    channels = ['index', f'author:{author_id}']
+    if group_id:
+        channels.append(f'group:{group_id}')
+    return channels
+
+
+def publish_post(post):
+    """Сообщить слушателям лент о новом посте (после коммита)."""
+    data = {'id': post.pk, 'author': post.author_id, 'group': post.group_id}
+    for channel in post_channels(post.author_id, post.group_id):
+        broker().publish(channel, data)
+
+
+def stream(channels, last_id):
+    """Поток SSE: события new_post и комментарии-пинги между ними.
+
+    Соединение живёт LIVE_STREAM_TIMEOUT секунд, потом браузер сам
+    переподключается с Last-Event-ID и ничего не теряет.
+    """
+    yield f'retry: {settings.LIVE_RETRY_MS}\n\n'
+    deadline = time.monotonic() + settings.LIVE_STREAM_TIMEOUT
+    remaining = settings.LIVE_STREAM_TIMEOUT
+    while remaining > 0:
+        events, last_id = broker().listen(
+            channels, last_id, min(remaining, settings.LIVE_KEEPALIVE))
+        for number, channel, data in events:
+            yield (f'id: {number}\nevent: new_post\n'
+                   f'data: {json.dumps(data)}\n\n')
+        if not events:
+            yield ': keepalive\n\n'
+        remaining = deadline - time.monotonic()
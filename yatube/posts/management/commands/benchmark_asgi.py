@@ -0,0 +1,228 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from . import benchmark_views
+from .benchmark_views import PERCENTILES, percentile
+
+VIEWS = ('index', 'group_posts', 'profile', 'post_view')
+SERVERS = ('wsgi', 'asgi')
+
+
+class Latency:
+    """execute_wrapper, добавляющий к каждому SQL-запросу сетевую задержку.
+
+    SQLite отвечает за микросекунды, и ожидание базы, ради которого
+    запросы выполняются одновременно, приходится имитировать.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self, connection):
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+
+class Command(benchmark_views.Command):
+    help = ('Пропускная способность лент через WSGI и ASGI при медленной '
+            'базе: с последовательными и одновременными запросами '
+            'представлений (CONCURRENT_QUERIES).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*', metavar='view',
+            help=f'Какие ленты мерить (по умолчанию все: {", ".join(VIEWS)}).')
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Запросов к каждому представлению.')
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Потоков сервера: воркеров WSGI или пула ASGI.')
+        parser.add_argument(
+            '--concurrency', type=int, default=16,
+            help='Сколько запросов цикл событий ASGI принимает сразу.')
+        parser.add_argument('--latency', type=float, default=20,
+                            help='Задержка каждого SQL-запроса, мс.')
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--no-setup', action='store_true',
+            help='Мерить на текущей базе, не создавая и не наполняя '
+                 'временную.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        views = options['views'] or VIEWS
+        unknown = set(views) - set(VIEWS)
+        if unknown:
+            raise CommandError(f'Только ленты для чтения: {VIEWS}')
+        self.options = options
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        latency = Latency(options['latency'] / 1000)
+        dummy = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+        with ExitStack() as stack:
+            # Без кэша страниц каждый запрос доходит до базы.
+            stack.enter_context(override_settings(
+                DEBUG=False, ALLOWED_HOSTS=hosts,
+                CACHES={'default': dummy, 'shared': dummy}))
+            if not options['no_setup']:
+                stack.callback(self.teardown, self.setup())
+            self.targets = benchmark_views.Targets(options['seed'])
+            self.handler = WSGIHandler()
+            connection_created.connect(latency.install)
+            stack.callback(connection_created.disconnect, latency.install)
+            for connection in connections.all():
+                latency.install(connection)
+                stack.callback(latency.uninstall, connection)
+            results = {}
+            for view in views:
+                for server in SERVERS:
+                    for concurrent in (False, True):
+                        with override_settings(CONCURRENT_QUERIES=concurrent):
+                            mode = f'{server}{"+gather" if concurrent else ""}'
+                            results[view, mode] = self.measure_server(
+                                server, view)
+        self.report(results)
+
+    def environ(self, view):
+        method, url, _ = self.targets(view)
+        return {
+            'REQUEST_METHOD': method.upper(), 'PATH_INFO': url,
+            'QUERY_STRING': '', 'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+            'wsgi.errors': io.StringIO(), 'wsgi.multithread': True,
+            'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+
+    def wsgi_request(self, view):
+        """Время ответа WSGI-воркера в мс или None при ошибке."""
+        environ = self.environ(view)
+        statuses = []
+        started = time.perf_counter()
+        try:
+            response = self.handler(
+                environ, lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()
+        except Exception as error:
+            self.stderr.write(f'{environ["PATH_INFO"]}: {error!r}')
+            return None
+        return self.timing(environ['PATH_INFO'], int(statuses[0][:3]),
+                           started)
+
+    async def asgi_request(self, application, view):
+        environ = self.environ(view)
+        url = urlsplit(environ['PATH_INFO'])
+        scope = {
+            'type': 'http', 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': url.path, 'root_path': '',
+            'query_string': url.query.encode(),
+            'headers': [(b'host', b'testserver')],
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+        }
+        statuses = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        started = time.perf_counter()
+        try:
+            await application(scope, receive, send)
+        except Exception as error:
+            self.stderr.write(f'{url.path}: {error!r}')
+            return None
+        return self.timing(url.path, statuses[0], started)
+
+    def timing(self, url, status, started):
+        elapsed = time.perf_counter() - started
+        if status != 200:
+            self.stderr.write(f'{url}: ответ {status}')
+            return None
+        return elapsed * 1000
+
+    def run_wsgi(self, view, count):
+        # Синхронный сервер: запрос целиком занимает один из воркеров.
+        def request(_):
+            try:
+                return self.wsgi_request(view)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(self.options['workers']) as pool:
+            return list(pool.map(request, range(count)))
+
+    def run_asgi(self, view, count):
+        from yatube.asgi import application
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            pool = ThreadPoolExecutor(self.options['workers'])
+            loop.set_default_executor(pool)
+            # Цикл событий принимает до --concurrency запросов сразу.
+            slots = asyncio.Semaphore(self.options['concurrency'])
+
+            async def request():
+                async with slots:
+                    return await self.asgi_request(application, view)
+
+            try:
+                return await asyncio.gather(
+                    *(request() for _ in range(count)))
+            finally:
+                await loop.run_in_executor(None, connections.close_all)
+                pool.shutdown()
+
+        return asyncio.run(run())
+
+    def measure_server(self, server, view):
+        run = getattr(self, f'run_{server}')
+        run(view, self.options['warmup'])
+        started = time.perf_counter()
+        timings = run(view, self.options['requests'])
+        wall = time.perf_counter() - started
+        successes = [timing for timing in timings if timing is not None]
+        if not successes:
+            raise CommandError(f'{view}: все запросы завершились ошибкой')
+        result = {
+            f'p{rank}': round(percentile(successes, rank), 2)
+            for rank in PERCENTILES
+        }
+        result['rps'] = round(len(successes) / wall, 1)
+        result['errors'] = len(timings) - len(successes)
+        return result
+
+    def report(self, results):
+        header = ('view', 'server', *(f'p{rank}, мс' for rank in PERCENTILES),
+                  'запросов/с', 'ошибок')
+        self.stdout.write('{:<14}{:<13}{:>11}{:>11}{:>11}{:>12}{:>8}'.format(
+            *header))
+        for (view, mode), result in results.items():
+            self.stdout.write(
+                '{:<14}{:<13}{p50:>11}{p95:>11}{p99:>11}{rps:>12}'
+                '{errors:>8}'.format(view, mode, **result))
@@ -0,0 +1,139 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from posts.models import Comment, FeedEntry, Follow, Group, Post, User
+from posts.paginator import NEXT, CursorPaginator
+
+INDEXES = (
+    'post_author_pub_date',
+    'post_group_pub_date',
+    'post_pub_date',
+    'comment_post_created',
+    'follow_author_user',
+)
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Планы и время запросов лент с составными индексами и без них. '
+            'Все изменения в базе откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0, metavar='POSTS',
+            help='Временно добавить столько постов (например, 1000000).')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--per-page', type=int, default=10)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Сравнение без индексов есть только для SQLite')
+        self.repeat = options['repeat']
+        self.per_page = options['per_page']
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['seed'])
+                queries = self.queries()
+                if not queries:
+                    raise CommandError('Нет данных: запустите с --seed')
+                self.report('С индексами', queries)
+                with connection.cursor() as cursor:
+                    for name in INDEXES:
+                        cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+                self.report('Без индексов', queries)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def queries(self):
+        post = Post.objects.order_by('?').first()
+        comment = Comment.objects.order_by('?').first()
+        follow = Follow.objects.order_by('?').first()
+        if post is None:
+            return {}
+        middle = Post.objects.order_by('-pub_date', '-id')[
+            Post.objects.count() // 2]
+        paginator = CursorPaginator(Post.objects.for_feed(), self.per_page)
+        page = slice(0, self.per_page + 1)
+        queries = {
+            'index': paginator.object_list,
+            'index, глубокая страница': paginator._seek(
+                NEXT, middle.pub_date, middle.id),
+            'profile': Post.objects.for_feed().filter(
+                author_id=post.author_id).order_by('-pub_date', '-id'),
+        }
+        if comment:
+            queries['comments'] = Comment.objects.filter(
+                post_id=comment.post_id).order_by('-created')
+        if post.group_id:
+            queries['group_posts'] = Post.objects.for_feed().filter(
+                group_id=post.group_id).order_by('-pub_date', '-id')
+        if follow:
+            queries['follow_index'] = FeedEntry.objects.filter(
+                user_id=follow.user_id).order_by('-pub_date', '-post_id')
+            queries['followers'] = Follow.objects.filter(
+                author_id=follow.author_id).values_list('user_id')
+        return {name: query[page] for name, query in queries.items()}
+
+    def report(self, title, queries):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, query in queries.items():
+            started = time.perf_counter()
+            for _ in range(self.repeat):
+                list(query.all())
+            elapsed = (time.perf_counter() - started) / self.repeat * 1000
+            self.stdout.write(f'{name}: {elapsed:.2f} мс')
+            for line in self.explain(query, title):
+                self.stdout.write(f'    {line}')
+
+    def explain(self, query, title):
+        # Комментарий делает текст запроса уникальным: иначе sqlite3
+        # вернёт план из кэша подготовленных выражений.
+        sql, params = query.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN /* {title} */ {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def seed(self, total):
+        """Быстро наполнить базу постами; pub_date идут по убыванию id."""
+        User.objects.bulk_create(
+            User(username=f'bench_{number}') for number in range(1000))
+        users = list(User.objects.filter(username__startswith='bench_'))
+        Group.objects.bulk_create(
+            Group(title=f'Группа {number}', slug=f'bench-{number}')
+            for number in range(50))
+        groups = list(Group.objects.filter(slug__startswith='bench-'))
+        field = Post._meta.get_field('pub_date')
+        field.auto_now_add = False
+        now = timezone.now()
+        try:
+            for start in range(0, total, BATCH_SIZE):
+                Post.objects.bulk_create(
+                    Post(text=f'Пост {number}', author=random.choice(users),
+                         group=random.choice(groups + [None]),
+                         pub_date=now - timedelta(seconds=total - number))
+                    for number in range(start, min(start + BATCH_SIZE, total))
+                )
+        finally:
+            field.auto_now_add = True
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        Comment.objects.bulk_create(
+            (Comment(text='Комментарий', author=random.choice(users),
+                     post_id=random.choice(post_ids))
+             for _ in range(total // 10)))
+        Follow.objects.bulk_create(
+            (Follow(user=user, author=author)
+             for user in users[:100] for author in random.sample(users, 20)
+             if user != author),
+            ignore_conflicts=True)
+        self.stdout.write(f'Добавлено постов: {total}')
@@ -0,0 +1,125 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from .benchmark_views import percentile
+
+
+class Workload:
+    """Читатели и писатели на одном файле SQLite с заданным профилем.
+
+    Писатель повторяет шаблон add_comment: читает, затем пишет в одной
+    транзакции. Читатель выбирает последние записи, как лента.
+    """
+
+    def __init__(self, path, pragmas, immediate):
+        self.path = path
+        self.pragmas = pragmas
+        self.begin = 'BEGIN IMMEDIATE' if immediate else 'BEGIN'
+        self.lock = threading.Lock()
+        self.read_timings = []
+        self.writes = 0
+        self.errors = 0
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, isolation_level=None,
+                                     check_same_thread=False)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def setup(self, rows):
+        connection = self.connect()
+        connection.execute(
+            'CREATE TABLE item (id INTEGER PRIMARY KEY, text TEXT)')
+        connection.executemany('INSERT INTO item (text) VALUES (?)',
+                               (('x' * 200,) for _ in range(rows)))
+        connection.close()
+
+    def write(self, connection, hold):
+        try:
+            connection.execute(self.begin)
+            connection.execute('SELECT max(id) FROM item').fetchone()
+            time.sleep(hold)
+            connection.execute('INSERT INTO item (text) VALUES (?)',
+                               ('y' * 200,))
+            connection.execute('COMMIT')
+        except sqlite3.OperationalError:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            with self.lock:
+                self.errors += 1
+            return
+        with self.lock:
+            self.writes += 1
+
+    def read(self, connection):
+        started = time.perf_counter()
+        connection.execute(
+            'SELECT id, text FROM item ORDER BY id DESC LIMIT 10').fetchall()
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.read_timings.append(elapsed)
+
+    def run(self, seconds, readers, writers, hold):
+        deadline = time.monotonic() + seconds
+
+        def loop(action, *args):
+            connection = self.connect()
+            try:
+                while time.monotonic() < deadline:
+                    action(connection, *args)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=loop, args=(self.read,))
+                   for _ in range(readers)]
+        threads += [threading.Thread(target=loop, args=(self.write, hold))
+                    for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает профили SQLite под конкурентной нагрузкой: время '
+            'чтений при идущих записях и ошибки «database is locked».')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument(
+            '--hold', type=float, default=0.002,
+            help='Сколько секунд писатель держит транзакцию.')
+
+    def handle(self, *args, **options):
+        header = ('профиль', 'чтений/с', 'p50, мс', 'p99, мс', 'записей/с',
+                  'ошибок')
+        self.stdout.write('{:<14}{:>10}{:>10}{:>10}{:>11}{:>8}'.format(
+            *header))
+        for profile, pragmas in settings.SQLITE_PROFILES.items():
+            directory = tempfile.mkdtemp(prefix='benchmark_sqlite_')
+            try:
+                workload = Workload(os.path.join(directory, 'db.sqlite3'),
+                                    pragmas, profile == 'performance')
+                workload.setup(options['rows'])
+                workload.run(options['seconds'], options['readers'],
+                             options['writers'], options['hold'])
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            reads = workload.read_timings or [0]
+            seconds = options['seconds']
+            self.stdout.write(
+                '{:<14}{:>10.0f}{:>10.2f}{:>10.2f}{:>11.0f}{:>8}'.format(
+                    profile, len(workload.read_timings) / seconds,
+                    percentile(reads, 50), percentile(reads, 99),
+                    workload.writes / seconds, workload.errors))
@@ -0,0 +1,260 @@
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+from yatube import instrumentation
+
+VIEWS = ('index', 'group_posts', 'profile', 'post_view', 'follow_index',
+         'add_comment', 'new_post')
+PERCENTILES = (50, 95, 99)
+SAMPLE = 200
+
+
+def percentile(values, rank):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+
+class Targets:
+    """Случайные адреса для сценариев: популярные группы, авторы, посты."""
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+        self.groups = list(Group.objects.order_by('pk').values_list(
+            'slug', flat=True)[:SAMPLE])
+        self.authors = list(User.objects.filter(
+            stats__posts_count__gt=0).order_by(
+                '-stats__posts_count').values_list(
+                    'username', flat=True)[:SAMPLE])
+        self.posts = list(Post.objects.order_by('-pub_date').values_list(
+            'author__username', 'pk')[:SAMPLE])
+        self.readers = list(User.objects.filter(
+            pk__in=Follow.objects.values('user')[:SAMPLE]))
+        if not (self.posts and self.readers):
+            raise CommandError('Нет постов или подписок: запустите seed_data')
+
+    def __call__(self, view):
+        """Метод, адрес и данные формы очередного запроса к view."""
+        choice = self.random.choice
+        if view == 'index':
+            return 'get', reverse('index'), None
+        if view == 'group_posts':
+            if not self.groups:
+                raise CommandError('Нет групп')
+            slug = choice(self.groups)
+            return 'get', reverse('group_posts', args=[slug]), None
+        if view == 'profile':
+            username = choice(self.authors)
+            return 'get', reverse('profile', args=[username]), None
+        if view == 'post_view':
+            return 'get', reverse('post', args=choice(self.posts)), None
+        if view == 'follow_index':
+            return 'get', reverse('follow_index'), None
+        if view == 'add_comment':
+            return 'post', reverse('add_comment', args=choice(self.posts)), {
+                'text': 'Комментарий из бенчмарка'}
+        return 'post', reverse('new_post'), {'text': 'Пост из бенчмарка'}
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер публичных страниц: перцентили времени ответа, '
+            'SQL-запросы на запрос и пропускная способность, со сравнением '
+            'с сохранённым эталоном.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*', metavar='view',
+            help=f'Какие представления мерить (по умолчанию все: '
+                 f'{", ".join(VIEWS)}).')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов к каждому представлению.')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--no-setup', action='store_true',
+            help='Мерить на текущей базе, не создавая и не наполняя '
+                 'временную. Запросы POST оставят в ней данные.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(settings.BASE_DIR, 'benchmark_baseline.json'),
+            help='Файл эталона; если он есть, результаты сравниваются с ним.')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Записать результаты как новый эталон.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимое ухудшение p95 и пропускной способности (доля).')
+
+    def handle(self, *args, **options):
+        views = options['views'] or VIEWS
+        unknown = set(views) - set(VIEWS)
+        if unknown:
+            raise CommandError(f'Неизвестные представления: {unknown}')
+        self.options = options
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(
+                DEBUG=False, ALLOWED_HOSTS=hosts))
+            if not options['no_setup']:
+                stack.callback(self.teardown, self.setup())
+            self.targets = Targets(options['seed'])
+            results = {view: self.measure(view) for view in views}
+        self.report(results)
+        self.compare(results)
+
+    def setup(self):
+        """Временная файловая база с данными из seed_data.
+
+        Реплики тоже переключаются на неё: иначе роутер отправил бы
+        чтения в рабочие базы.
+        """
+        directory = tempfile.mkdtemp(prefix='benchmark_')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            directory, 'db.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0)
+        replicas = {}
+        for alias in connections:
+            if alias == DEFAULT_DB_ALIAS:
+                continue
+            replica = connections[alias]
+            replica.close()
+            replicas[alias] = replica.settings_dict['NAME']
+            replica.settings_dict['NAME'] = connection.settings_dict['NAME']
+        options = self.options
+        call_command(
+            'seed_data', users=options['users'], posts=options['posts'],
+            comments=options['comments'], follows=options['follows'],
+            seed=options['seed'], prefix='bench', stdout=self.stdout)
+        return old_name, replicas, directory
+
+    def teardown(self, state):
+        old_name, replicas, directory = state
+        for alias, name in replicas.items():
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = name
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def client(self):
+        client = Client()
+        client.force_login(self.targets.random.choice(self.targets.readers))
+        return client
+
+    def request(self, client, view):
+        """Время ответа в мс или None, если запрос завершился ошибкой."""
+        method, url, data = self.targets(view)
+        started = time.perf_counter()
+        try:
+            response = getattr(client, method)(url, data)
+        except Exception as error:
+            self.stderr.write(f'{url}: {error!r}')
+            return None
+        elapsed = time.perf_counter() - started
+        if response.status_code not in (200, 302):
+            self.stderr.write(f'{url}: ответ {response.status_code}')
+            return None
+        return elapsed * 1000
+
+    def measure(self, view):
+        options = self.options
+        client = self.client()
+        for _ in range(options['warmup']):
+            self.request(client, view)
+        instrumentation.reset()
+        concurrency = options['concurrency']
+        share, rest = divmod(options['requests'], concurrency)
+        counts = [share + (worker < rest) for worker in range(concurrency)]
+
+        def worker(count):
+            client = self.client()
+            try:
+                return [self.request(client, view) for _ in range(count)]
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        if concurrency == 1:
+            timings = [self.request(client, view)
+                       for _ in range(options['requests'])]
+        else:
+            with ThreadPoolExecutor(concurrency) as pool:
+                timings = sum(pool.map(worker, counts), [])
+        wall = time.perf_counter() - started
+        successes = [timing for timing in timings if timing is not None]
+        if not successes:
+            raise CommandError(f'{view}: все запросы завершились ошибкой')
+        histograms = instrumentation.histograms().values()
+        total = sum(data['count'] for data in histograms) or 1
+        result = {
+            f'p{rank}': round(percentile(successes, rank), 2)
+            for rank in PERCENTILES
+        }
+        result['queries'] = round(
+            sum(data['sql_count'] for data in histograms) / total, 2)
+        result['rps'] = round(len(successes) / wall, 1)
+        result['errors'] = len(timings) - len(successes)
+        return result
+
+    def report(self, results):
+        header = ('view', *(f'p{rank}, мс' for rank in PERCENTILES),
+                  'SQL/запрос', 'запросов/с', 'ошибок')
+        self.stdout.write('{:<14}{:>11}{:>11}{:>11}{:>12}{:>12}{:>8}'.format(
+            *header))
+        for view, result in results.items():
+            self.stdout.write(
+                '{:<14}{p50:>11}{p95:>11}{p99:>11}{queries:>12}{rps:>12}'
+                '{errors:>8}'.format(view, **result))
+
+    def compare(self, results):
+        path = self.options['baseline']
+        if self.options['save_baseline']:
+            with open(path, 'w') as baseline:
+                json.dump(results, baseline, indent=2, sort_keys=True)
+            self.stdout.write(f'Эталон сохранён в {path}')
+            return
+        if not os.path.exists(path):
+            return
+        with open(path) as baseline:
+            baseline = json.load(baseline)
+        tolerance = 1 + self.options['tolerance']
+        regressions = []
+        for view, result in results.items():
+            expected = baseline.get(view)
+            if expected is None:
+                continue
+            if result['errors'] > expected.get('errors', 0):
+                regressions.append(
+                    f'{view}: ошибок {expected.get("errors", 0)} → '
+                    f'{result["errors"]}')
+            if result['queries'] > expected['queries']:
+                regressions.append(
+                    f'{view}: SQL {expected["queries"]} → {result["queries"]}')
+            if result['p95'] > expected['p95'] * tolerance:
+                regressions.append(
+                    f'{view}: p95 {expected["p95"]} → {result["p95"]} мс')
+            if result['rps'] * tolerance < expected['rps']:
+                regressions.append(
+                    f'{view}: {expected["rps"]} → {result["rps"]} запросов/с')
+        if regressions:
+            raise CommandError('Регрессии относительно эталона:\n'
+                               + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
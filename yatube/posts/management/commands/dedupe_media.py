@@ -0,0 +1,49 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Переводит файлы MEDIA_ROOT на хранение по содержимому: '
+            'одинаковые файлы становятся ссылками на один blob, blob\'ы '
+            'без ссылок удаляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать дубликаты.')
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        if not hasattr(storage, 'deduplicate'):
+            raise CommandError('DEFAULT_FILE_STORAGE не хранит файлы '
+                               'по содержимому')
+        if options['dry_run']:
+            self.dry_run(storage)
+            return
+        files = saved = 0
+        for name in list(storage.names()):
+            files += 1
+            saved += storage.deduplicate(name)
+        removed = storage.collect_garbage()
+        self.stdout.write(f'Файлов: {files}, освобождено: {saved} Б, '
+                          f'удалено blob\'ов без ссылок: {removed}')
+
+    def dry_run(self, storage):
+        sizes = {}
+        inodes = set()
+        files = duplicate_bytes = 0
+        for name in storage.names():
+            files += 1
+            stat = os.stat(storage.path(name))
+            # Ссылки на уже общий blob места не занимают.
+            if (stat.st_dev, stat.st_ino) in inodes:
+                continue
+            inodes.add((stat.st_dev, stat.st_ino))
+            digest = storage.digest(name)
+            if digest in sizes:
+                duplicate_bytes += sizes[digest]
+            else:
+                sizes[digest] = storage.size(name)
+        self.stdout.write(f'Файлов: {files}, уникальных: {len(sizes)}, '
+                          f'дубликаты занимают: {duplicate_bytes} Б')
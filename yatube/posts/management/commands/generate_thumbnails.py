@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Нарезает миниатюры и их варианты для srcset постов, '
+            'у которых их ещё нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать миниатюры всех постов.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None)
+        if not options['all']:
+            posts = posts.filter(
+                Q(thumbnail='') | Q(thumbnail=None) | Q(variants=''))
+        done = 0
+        for post_id in posts.values_list('pk', flat=True).iterator():
+            if thumbnails.generate(post_id):
+                done += 1
+        self.stdout.write(f'Миниатюр создано: {done}')
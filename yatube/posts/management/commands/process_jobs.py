@@ -0,0 +1,66 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import jobs
+from posts.models import Job
+
+
+class Command(BaseCommand):
+    help = ('Воркер очереди задач: выполняет побочные эффекты записей '
+            'в пуле потоков, повторяя упавшие задачи.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Потоков в пуле.')
+        parser.add_argument('--batch', type=int, default=50,
+                            help='Задач, забираемых за раз.')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти.')
+        parser.add_argument('--stats', action='store_true',
+                            help='Только показать число и время задач.')
+        parser.add_argument(
+            '--purge', type=int, metavar='DAYS',
+            help='Удалить выполненные задачи старше DAYS дней.')
+
+    def handle(self, *args, **options):
+        if options['purge'] is not None:
+            self.purge(options['purge'])
+        if options['stats']:
+            self.report()
+            return
+        done = failed = 0
+        with ThreadPoolExecutor(options['workers'],
+                                thread_name_prefix='jobs') as pool:
+            while True:
+                batch = jobs.claim(options['batch'])
+                if not batch:
+                    if options['once']:
+                        break
+                    time.sleep(settings.JOB_POLL_INTERVAL)
+                    continue
+                for success in pool.map(jobs.run_in_thread, batch):
+                    done += success
+                    failed += not success
+        self.stdout.write(f'Выполнено задач: {done}, с ошибкой: {failed}')
+
+    def purge(self, days):
+        deleted, _ = Job.objects.filter(
+            status=Job.DONE,
+            finished__lt=timezone.now() - timedelta(days=days)).delete()
+        self.stdout.write(f'Удалено выполненных задач: {deleted}')
+
+    def report(self):
+        self.stdout.write('{:<40}{:>8}{:>9}{:>8}{:>9}{:>10}{:>10}'.format(
+            'задача', 'всего', 'ожидают', 'ошибок', 'готово', 'сред, мс',
+            'макс, мс'))
+        for row in jobs.stats():
+            self.stdout.write(
+                '{name:<40}{total:>8}{pending:>9}{failed:>8}{done:>9}'
+                '{avg:>10}{max:>10}'.format(
+                    avg=round(row['avg_ms'] or 0, 2),
+                    max=round(row['max_ms'] or 0, 2), **row))
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from posts.models import Comment, Follow, Post, User, UserStats
+from yatube.sqlite.transaction import atomic_write
+
+USER_COUNTERS = (
+    ('posts_count', Post, 'author'),
+    ('followers_count', Follow, 'author'),
+    ('following_count', Follow, 'user'),
+)
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сверить счётчики, ничего не записывая.')
+
+    def handle(self, *args, **options):
+        verify = options['verify']
+        with (transaction.atomic() if verify else atomic_write()):
+            mismatches = (self.rebuild_posts(verify)
+                          + self.rebuild_users(verify))
+        if verify and mismatches:
+            raise CommandError(f'Расхождений в счётчиках: {mismatches}')
+        action = 'Найдено' if verify else 'Исправлено'
+        self.stdout.write(f'{action} расхождений: {mismatches}')
+
+    def rebuild_posts(self, verify):
+        actual = dict(Comment.objects.values_list('post').annotate(
+            total=Count('id')).order_by())
+        stale = []
+        stored = Post.objects.values_list('pk', 'comment_count').order_by()
+        for pk, comment_count in stored.iterator():
+            if actual.get(pk, 0) != comment_count:
+                stale.append(Post(pk=pk, comment_count=actual.get(pk, 0)))
+        if not verify:
+            Post.objects.bulk_update(stale, ['comment_count'],
+                                     batch_size=BATCH_SIZE)
+        return len(stale)
+
+    def rebuild_users(self, verify):
+        actual = {pk: UserStats(user_id=pk)
+                  for pk in User.objects.values_list('pk', flat=True)}
+        for name, model, field in USER_COUNTERS:
+            rows = model.objects.values_list(field).annotate(
+                total=Count('id')).order_by()
+            for pk, total in rows:
+                setattr(actual[pk], name, total)
+        fields = [name for name, model, field in USER_COUNTERS]
+        stored = {stats.pk: stats for stats in UserStats.objects.all()}
+        missing = [
+            stats for pk, stats in actual.items() if pk not in stored and any(
+                getattr(stats, name) for name in fields)
+        ]
+        stale = [
+            stats for pk, stats in actual.items() if pk in stored and any(
+                getattr(stats, name) != getattr(stored[pk], name)
+                for name in fields)
+        ]
+        if not verify:
+            # Размер пачки вставки Django выберет сам: SQLite не примет
+            # больше 500 строк в одном INSERT.
+            UserStats.objects.bulk_create(missing)
+            UserStats.objects.bulk_update(stale, fields,
+                                          batch_size=BATCH_SIZE)
+        return len(missing) + len(stale)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+from yatube.sqlite.transaction import atomic_write
+
+
+class Command(BaseCommand):
+    help = 'Строит поисковый индекс постов заново.'
+
+    def handle(self, *args, **options):
+        with atomic_write():
+            search.rebuild()
+        self.stdout.write(f'Индекс перестроен ({search.backend()})')
@@ -0,0 +1,244 @@
+import multiprocessing
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max
+from django.utils import timezone
+
+from posts import feed
+from posts.models import Comment, Follow, Group, Post, User
+from yatube.sqlite.transaction import atomic_write
+
+WORDS = (
+    'день', 'город', 'лето', 'книга', 'море', 'дорога', 'кофе', 'кот',
+    'работа', 'друг', 'вечер', 'фото', 'музыка', 'дом', 'утро', 'снег',
+    'поезд', 'река', 'парк', 'код', 'идея', 'сад', 'небо', 'ветер',
+    'сегодня', 'снова', 'очень', 'просто', 'новый', 'старый', 'тихий',
+    'наконец', 'вместе', 'долго', 'быстро', 'хороший', 'первый', 'весь',
+)
+NO_GROUP_SHARE = 0.3
+
+# Состояние для дочерних процессов: передаётся один раз в initializer.
+_state = {}
+
+
+def zipf_weights(count, skew):
+    """Накопленные веса закона Ципфа: первый элемент самый популярный."""
+    return list(accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def _text(rnd, low, high):
+    return ' '.join(rnd.choices(WORDS, k=rnd.randint(low, high))).capitalize()
+
+
+def _init_worker(state):
+    _state.update(state)
+
+
+def _chunks(total, size):
+    return [(start, min(start + size, total))
+            for start in range(0, total, size)]
+
+
+def _rnd(kind, start):
+    # Зерно зависит только от номера пачки: результат не зависит от
+    # числа процессов.
+    return random.Random(f'{_state["seed"]}:{kind}:{start}')
+
+
+def _seed_posts(bounds):
+    start, stop = bounds
+    rnd = _rnd('posts', start)
+    users, groups = _state['users'], _state['groups']
+    begin, step = _state['begin'], _state['post_step']
+    authors = rnd.choices(users, cum_weights=_state['user_weights'],
+                          k=stop - start)
+    posts = []
+    for number, author_id in zip(range(start, stop), authors):
+        group_id = None
+        if groups and rnd.random() > NO_GROUP_SHARE:
+            group_id, = rnd.choices(groups,
+                                    cum_weights=_state['group_weights'])
+        posts.append(Post(
+            text=_text(rnd, 5, 60), author_id=author_id, group_id=group_id,
+            pub_date=begin + step * (number + rnd.random())))
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        Post.objects.bulk_create(posts)
+    finally:
+        field.auto_now_add = True
+    return len(posts)
+
+
+def _seed_comments(bounds):
+    start, stop = bounds
+    rnd = _rnd('comments', start)
+    post_ids, users = _state['post_ids'], _state['users']
+    begin, step, end = _state['begin'], _state['post_step'], _state['end']
+    # post_ids отсортированы от новых к старым: новые посты обсуждают чаще.
+    indexes = rnd.choices(range(len(post_ids)),
+                          cum_weights=_state['post_weights'], k=stop - start)
+    authors = rnd.choices(users, cum_weights=_state['user_weights'],
+                          k=stop - start)
+    comments = []
+    for index, author_id in zip(indexes, authors):
+        published = begin + step * (len(post_ids) - index)
+        comments.append(Comment(
+            text=_text(rnd, 2, 20), author_id=author_id,
+            post_id=post_ids[index],
+            created=published + (end - published) * rnd.random()))
+    field = Comment._meta.get_field('created')
+    field.auto_now_add = False
+    try:
+        Comment.objects.bulk_create(comments)
+    finally:
+        field.auto_now_add = True
+    return len(comments)
+
+
+def _seed_follows(bounds):
+    start, stop = bounds
+    rnd = _rnd('follows', start)
+    users = _state['users']
+    authors = rnd.choices(users, cum_weights=_state['user_weights'],
+                          k=stop - start)
+    follows = [Follow(user_id=rnd.choice(users), author_id=author_id)
+               for author_id in authors]
+    Follow.objects.bulk_create(
+        [follow for follow in follows if follow.user_id != follow.author_id],
+        ignore_conflicts=True)
+    return len(follows)
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу пользователями, группами, постами, комментариями '
+            'и подписками с распределением по закону Ципфа — для замеров '
+            'производительности на объёмах, близких к боевым.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=2000000)
+        parser.add_argument('--follows', type=int, default=200000)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить посты.')
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель закона Ципфа: чем больше, тем сильнее перекос.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов для вставки (не для SQLite).')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора: одинаковые параметры дают одни данные.')
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имён пользователей и адресов групп.')
+        parser.add_argument(
+            '--no-feeds', action='store_true',
+            help='Не раскладывать посты по лентам подписчиков.')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Данные с префиксом «{prefix}» уже есть: укажите --prefix')
+        self.batch_size = options['batch_size']
+        self.workers = options['workers']
+        if self.workers > 1 and connection.vendor == 'sqlite':
+            self.stderr.write('SQLite не пишет параллельно: один процесс')
+            self.workers = 1
+        end = timezone.now()
+        begin = end - timedelta(days=options['days'])
+        state = {
+            'seed': options['seed'],
+            'begin': begin,
+            'end': end,
+            'post_step': (end - begin) / max(options['posts'], 1),
+        }
+        state['users'] = self.seed_users(prefix, options['users'])
+        state['user_weights'] = zipf_weights(len(state['users']),
+                                             options['skew'])
+        state['groups'] = self.seed_groups(prefix, options['groups'])
+        state['group_weights'] = zipf_weights(len(state['groups']),
+                                              options['skew'])
+        last_post = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        self.run('Посты', _seed_posts, options['posts'], state)
+        state['post_ids'] = list(
+            Post.objects.filter(pk__gt=last_post).order_by(
+                '-pub_date').values_list('pk', flat=True))
+        state['post_weights'] = zipf_weights(len(state['post_ids']),
+                                             options['skew'])
+        if state['post_ids']:
+            self.run('Комментарии', _seed_comments, options['comments'],
+                     state)
+            Comment.objects.set_root_paths()
+        del state['post_ids'], state['post_weights']
+        last_follow = Follow.objects.aggregate(last=Max('pk'))['last'] or 0
+        self.run('Подписки', _seed_follows, options['follows'], state)
+        self.finish(last_follow, options['no_feeds'])
+
+    def seed_users(self, prefix, total):
+        password = make_password(None)
+        for start, stop in _chunks(total, self.batch_size):
+            User.objects.bulk_create(
+                User(username=f'{prefix}_{number}', password=password)
+                for number in range(start, stop))
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_').order_by('pk').values_list(
+                'pk', flat=True))
+
+    def seed_groups(self, prefix, total):
+        Group.objects.bulk_create(
+            Group(title=f'Группа {number}', slug=f'{prefix}-{number}',
+                  description=f'Сообщество номер {number}')
+            for number in range(total))
+        return list(Group.objects.filter(
+            slug__startswith=f'{prefix}-').order_by('pk').values_list(
+                'pk', flat=True))
+
+    def run(self, title, worker, total, state):
+        started = time.perf_counter()
+        chunks = _chunks(total, self.batch_size)
+        if self.workers > 1:
+            # Дочерние процессы не должны делить соединение с родителем.
+            connections.close_all()
+            # Только fork: дочерний процесс наследует настроенный Django
+            # вместе с настройками, изменёнными на ходу (база бенчмарка).
+            # При spawn и forkserver он заново прочитал бы settings.py.
+            context = multiprocessing.get_context('fork')
+            with context.Pool(self.workers, _init_worker, (state,)) as pool:
+                done = sum(pool.imap_unordered(worker, chunks))
+        else:
+            _init_worker(state)
+            with atomic_write():
+                done = sum(map(worker, chunks))
+        _state.clear()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{title}: {done} за {elapsed:.1f} с')
+
+    def finish(self, last_follow, no_feeds):
+        # bulk_create не шлёт сигналы: счётчики, поиск, ленты и кэш страниц
+        # приводим в порядок отдельно.
+        call_command('rebuild_counters', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        if not no_feeds:
+            started = time.perf_counter()
+            authors = Follow.objects.filter(pk__gt=last_follow).values_list(
+                'author_id', flat=True).distinct().order_by()
+            with atomic_write():
+                feed.rebuild(list(authors))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'Ленты подписок: {elapsed:.1f} с')
+        cache.clear()
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from yatube.db_router import PRIMARY
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в реплики из DATABASE_REPLICAS '
+            '— локальная замена настоящей репликации.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд, имитируя отставание реплик.')
+
+    def handle(self, *args, **options):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('Реплики не настроены: задайте YATUBE_REPLICAS')
+        aliases = [PRIMARY, *replicas]
+        if any(connections[alias].vendor != 'sqlite' for alias in aliases):
+            raise CommandError('Копировать можно только базы SQLite; '
+                               'остальные реплицирует сервер БД')
+        while True:
+            started = time.perf_counter()
+            self.sync(replicas)
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(f'Реплики обновлены за {elapsed:.0f} мс')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, replicas):
+        primary = connections[PRIMARY]
+        primary.ensure_connection()
+        for alias in replicas:
+            replica = connections[alias]
+            replica.ensure_connection()
+            # Онлайн-копия sqlite3: читатели реплики видят либо старый,
+            # либо новый снимок целиком.
+            primary.connection.backup(replica.connection)
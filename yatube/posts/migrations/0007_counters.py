@@ -0,0 +1,61 @@
+# Generated by Django 2.2.6 on 2026-10-18 17:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserStats = apps.get_model('posts', 'UserStats')
+
+    for row in Comment.objects.values('post').annotate(total=Count('id')):
+        Post.objects.filter(pk=row['post']).update(
+            comment_count=row['total'])
+    stats = {pk: UserStats(user_id=pk)
+             for pk in User.objects.values_list('pk', flat=True)}
+    counters = (
+        ('posts_count', Post, 'author'),
+        ('followers_count', Follow, 'author'),
+        ('following_count', Follow, 'user'),
+    )
+    for name, model, field in counters:
+        rows = model.objects.values(field).annotate(total=Count('id'))
+        for row in rows:
+            setattr(stats[row[field]], name, row['total'])
+    UserStats.objects.bulk_create(stats.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0006_auto_20210708_0104'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.Post'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 2.2.6 on 2026-10-18 17:45
+
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'posts_post_fts'
+TOKEN_RE = re.compile(r'\w+')
+
+
+def create_fts(schema_editor):
+    """Таблица FTS5, если SQLite собран с ней; иначе False."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    try:
+        # Префиксный индекс: запросы «слово*» не перебирают все формы.
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(text, group_title, '
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6')")
+    except OperationalError:
+        return False
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, text, group_title) '
+        "SELECT p.id, replace(replace(p.text, 'ё', 'е'), 'Ё', 'Е'), "
+        "replace(replace(coalesce(g.title, ''), 'ё', 'е'), 'Ё', 'Е') "
+        'FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id')
+    return True
+
+
+def fill_index(apps, schema_editor):
+    if create_fts(schema_editor):
+        return
+    Post = apps.get_model('posts', 'Post')
+    PostTerm = apps.get_model('posts', 'PostTerm')
+
+    for post in Post.objects.select_related('group').iterator():
+        title = post.group.title if post.group else ''
+        weights = Counter()
+        for text, weight in ((post.text, 2), (title, 1)):
+            for token in TOKEN_RE.findall(
+                    text.replace('ё', 'е').replace('Ё', 'Е').lower()):
+                if len(token) <= 64:
+                    weights[token] += weight
+        PostTerm.objects.bulk_create(
+            PostTerm(post_id=post.pk, term=term, weight=min(weight, 32767))
+            for term, weight in weights.items())
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='posts.Post')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='postterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_post_term'),
+        ),
+        migrations.RunPython(fill_index, drop_fts),
+    ]
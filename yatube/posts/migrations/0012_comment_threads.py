@@ -0,0 +1,38 @@
+# Generated by Django 2.2.6 on 2026-10-18 18:17
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, LPad
+import django.db.models.deletion
+
+
+def set_root_paths(apps, schema_editor):
+    # Все существующие комментарии — корни своих веток.
+    Comment = apps.get_model('posts', 'Comment')
+    Comment.objects.update(
+        path=LPad(Cast('pk', CharField()), 10, Value('0')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path'),
+        ),
+        migrations.RunPython(set_root_paths, migrations.RunPython.noop),
+    ]
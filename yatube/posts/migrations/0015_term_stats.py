@@ -0,0 +1,35 @@
+# Generated by Django 2.2.6 on 2026-10-18 18:44
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_stats(apps, schema_editor):
+    PostTerm = apps.get_model('posts', 'PostTerm')
+    TermStats = apps.get_model('posts', 'TermStats')
+    frequencies = PostTerm.objects.order_by().values('term').annotate(
+        posts=Count('post_id'))
+    TermStats.objects.bulk_create(
+        TermStats(term=row['term'], posts=row['posts'])
+        for row in frequencies.iterator())
+    # Пустое слово хранит число проиндексированных постов.
+    documents = PostTerm.objects.order_by().values('post_id').distinct()
+    TermStats.objects.create(term='', posts=documents.count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermStats',
+            fields=[
+                ('term', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('posts', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import CharField, Q, Value
+from django.db.models.functions import Cast, LPad
 
 User = get_user_model()
 
@@ -13,6 +16,12 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Авторы и группы одним JOIN, комментарии считает comment_count."""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField('date published', auto_now_add=True)
@@ -21,13 +30,66 @@ class Post(models.Model):
     group = models.ForeignKey(Group, on_delete=models.SET_NULL,
                               blank=True, null=True, related_name='posts')
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    thumbnail = models.ImageField(blank=True, null=True, editable=False)
+    # Варианты миниатюры по ширине для srcset: «имя 480w,имя 960w».
+    variants = models.TextField(blank=True, default='', editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='post_author_pub_date'),
+            models.Index(fields=('group', '-pub_date', '-id'),
+                         name='post_group_pub_date'),
+            models.Index(fields=('-pub_date', '-id'), name='post_pub_date'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def srcset(self):
+        storage = self.thumbnail.storage
+        return ', '.join(
+            f'{storage.url(name)} {width}'
+            for name, width in (variant.split(' ')
+                                for variant in self.variants.split(','))
+        ) if self.variants else ''
+
+
+# Сегмент пути комментария — его id с ведущими нулями: пути сортируются
+# как строки в порядке веток, а ':' идёт в ASCII сразу после цифр.
+PATH_STEP = 10
+PATH_END = ':'
+
+
+def path_segment(pk):
+    return LPad(Cast(pk, CharField()), PATH_STEP, Value('0'))
+
+
+class CommentQuerySet(models.QuerySet):
+    def set_root_paths(self):
+        """Пути корневым комментариям, созданным bulk_create без save()."""
+        return self.filter(path='', parent=None).update(
+            path=path_segment('pk'))
+
+    def subtrees(self, *comments):
+        """Ответы на комментарии на любой глубине в порядке веток.
+
+        Ветка — диапазон путей, так что это один запрос по индексу
+        (post, path), а не запрос на каждый уровень.
+        """
+        ranges = Q()
+        for comment in comments:
+            ranges |= Q(post_id=comment.post_id, path__gt=comment.path,
+                        path__lt=comment.path + PATH_END)
+        if not ranges:
+            return self.none()
+        return self.filter(ranges).order_by('path')
+
 
 class Comment(models.Model):
     text = models.TextField()
@@ -36,9 +98,36 @@ class Comment(models.Model):
                                related_name='comments')
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
                              related_name='comments')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE,
+                               blank=True, null=True, related_name='replies')
+    # Материализованный путь: пути предков и собственный id.
+    path = models.CharField(max_length=255, default='', editable=False)
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=('post', '-created'),
+                         name='comment_post_created'),
+            models.Index(fields=('post', 'path'), name='comment_post_path'),
+        ]
+
+    @property
+    def depth(self):
+        return max(len(self.path) // PATH_STEP - 1, 0)
+
+    def save(self, *args, **kwargs):
+        creating = self.pk is None
+        if creating and self.parent is not None and (
+                self.parent.depth >= settings.COMMENT_MAX_DEPTH):
+            # Глубже не вкладываем: ответ встаёт рядом с комментарием.
+            self.parent = self.parent.parent
+        super().save(*args, **kwargs)
+        if creating:
+            prefix = self.parent.path if self.parent is not None else ''
+            self.path = f'{prefix}{self.pk:0{PATH_STEP}d}'
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
 
 
 class Follow(models.Model):
@@ -52,3 +141,120 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=('user', 'author'),
                                     name='unique_list')
         ]
+        indexes = [
+            models.Index(fields=('author', 'user'), name='follow_author_user'),
+        ]
+
+
+class UserStatsManager(models.Manager):
+    def for_user(self, user):
+        """Счётчики пользователя; если записи ещё нет — нулевые."""
+        try:
+            return user.stats
+        except UserStats.DoesNotExist:
+            return UserStats(user=user)
+
+    def add(self, user_id, **deltas):
+        """Атомарно изменить счётчики: add(user.id, posts_count=1)."""
+        updates = {name: models.F(name) + delta
+                   for name, delta in deltas.items()}
+        stats = self.filter(user_id=user_id)
+        for name, delta in deltas.items():
+            if delta < 0:
+                stats = stats.filter(**{f'{name}__gte': -delta})
+        if stats.update(**updates) or min(deltas.values()) < 0:
+            return
+        self.get_or_create(user_id=user_id)
+        stats.update(**updates)
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    objects = UserStatsManager()
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок: пост автора, разложенный подписчику."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='feed')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='feed_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'post'),
+                                    name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=('user', '-pub_date', '-post'),
+                         name='feed_user_pub_date'),
+            models.Index(fields=('user', 'author'), name='feed_user_author'),
+        ]
+
+
+class PostTerm(models.Model):
+    """Инвертированный индекс поиска: слово и пост, где оно встречается.
+
+    Используется, когда в базе нет полнотекстового поиска SQLite FTS5.
+    """
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='terms')
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('term', 'post'),
+                                    name='unique_post_term')
+        ]
+
+
+class TermStats(models.Model):
+    """Сколько постов содержат слово: частота для TF-IDF поиска PostTerm.
+
+    Строка с пустым словом хранит число проиндексированных постов.
+    """
+    term = models.CharField(max_length=64, primary_key=True)
+    posts = models.PositiveIntegerField(default=0)
+
+
+class Job(models.Model):
+    """Отложенный побочный эффект записи для воркера process_jobs."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(PENDING, 'В очереди'), (RUNNING, 'Выполняется'),
+                (DONE, 'Выполнено'), (FAILED, 'Ошибка')]
+
+    name = models.CharField(max_length=100)
+    args = models.TextField(default='[]')
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField()
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True,
+                                 help_text='Время выполнения, мс')
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('status', 'run_after'),
+                         name='job_status_run_after'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
@@ -0,0 +1,149 @@
+import base64
+import binascii
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу (key, id) без OFFSET и COUNT(*).
+
+    Страница выбирается непрозрачным курсором ``?cursor=``, поэтому
+    тысячная страница стоит столько же, сколько первая. Старые ссылки
+    вида ``?page=N`` продолжают работать через обычный Paginator, но
+    только в пределах count_limit записей.
+    """
+
+    def __init__(self, object_list, per_page, key='pub_date',
+                 tiebreak='pk', count_limit=None, **kwargs):
+        self.key = key
+        self.tiebreak = tiebreak
+        self.count_limit = count_limit
+        super().__init__(object_list.order_by(f'-{key}', f'-{tiebreak}'),
+                         per_page, **kwargs)
+
+    def get_page(self, number=None, cursor=None):
+        if cursor:
+            try:
+                return self.cursor_page(cursor)
+            except InvalidCursor:
+                pass
+        if number is None:
+            return self.cursor_page(None)
+        page = super().get_page(number)
+        items = list(page.object_list)
+        page.object_list = items
+        page.cursor = None
+        # За последней нумерованной страницей записи могут продолжаться.
+        more = page.has_next() or not self.count_is_exact
+        page.next_cursor = (
+            self.encode_cursor(NEXT, items[-1]) if more and items else None)
+        page.previous_cursor = (
+            self.encode_cursor(PREVIOUS, items[0])
+            if page.has_previous() else None)
+        return page
+
+    def cursor_page(self, cursor):
+        """Страница после (или перед) курсором, одним запросом по индексу."""
+        per_page = self.per_page
+        if cursor is None:
+            direction = NEXT
+            rows = list(self.object_list[:per_page + 1])
+        else:
+            direction, value, pk = self.decode_cursor(cursor)
+            rows = list(self._seek(direction, value, pk)[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if direction == NEXT:
+            has_next, has_previous = has_more, cursor is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        if not rows:
+            has_next = has_previous = False
+        page = Page(rows, None, self)
+        self._navigate(page, has_next, has_previous)
+        page.cursor = cursor
+        page.next_cursor = (
+            self.encode_cursor(NEXT, rows[-1]) if has_next else None)
+        page.previous_cursor = (
+            self.encode_cursor(PREVIOUS, rows[0]) if has_previous else None)
+        return page
+
+    @staticmethod
+    def _navigate(page, has_next, has_previous):
+        # У страницы по курсору нет номера, и методы Page, считающие от
+        # него, заменены на её экземпляре: класс остаётся Page, как у
+        # страниц обычного Paginator.
+        def no_number():
+            raise InvalidPage('Страница по курсору не имеет номера')
+
+        page.has_next = lambda: has_next
+        page.has_previous = lambda: has_previous
+        page.has_other_pages = lambda: has_next or has_previous
+        page.next_page_number = page.previous_page_number = no_number
+
+    def _seek(self, direction, value, pk):
+        key, tiebreak = self.key, self.tiebreak
+        if direction == NEXT:
+            return self.object_list.filter(
+                Q(**{f'{key}__lt': value})
+                | Q(**{key: value, f'{tiebreak}__lt': pk}))
+        return self.object_list.filter(
+            Q(**{f'{key}__gt': value})
+            | Q(**{key: value, f'{tiebreak}__gt': pk})
+        ).order_by(key, tiebreak)
+
+    def encode_cursor(self, direction, obj):
+        value = getattr(obj, self.key)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        pk = getattr(obj, self.tiebreak)
+        raw = f'{direction}|{value}|{pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+            direction, value, pk = raw.split('|')
+            field = self.object_list.model._meta.get_field(self.key)
+            value = field.to_python(value)
+            pk = int(pk)
+        except (binascii.Error, UnicodeError, ValueError, ValidationError):
+            raise InvalidCursor('Некорректный курсор')
+        if direction not in (NEXT, PREVIOUS) or value is None:
+            raise InvalidCursor('Некорректный курсор')
+        return direction, value, pk
+
+    @cached_property
+    def count(self):
+        """Число записей для ?page=N, не больше count_limit.
+
+        Глубже номера страниц не листают: COUNT и OFFSET ограничены, а
+        дальше ведёт курсор последней нумерованной страницы.
+        """
+        if self.count_limit is None:
+            return super().count
+        return min(self.approximate_count, self.count_limit)
+
+    @cached_property
+    def approximate_count(self):
+        """Число записей, но не больше count_limit (None — не считаем)."""
+        if self.count_limit is None:
+            return None
+        return self.object_list[:self.count_limit + 1].count()
+
+    @property
+    def count_is_exact(self):
+        return (self.approximate_count is not None
+                and self.approximate_count <= self.count_limit)
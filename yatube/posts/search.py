@@ -0,0 +1,308 @@
+import math
+import re
+from abc import ABC, abstractmethod
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import (Case, Count, F, FloatField, IntegerField, Q,
+                              Sum, Value, When)
+from django.utils.functional import cached_property
+
+from yatube.sqlite.transaction import atomic_write
+
+from .models import Group, Post, PostTerm, TermStats
+
+FTS_TABLE = 'posts_post_fts'
+TOKEN_RE = re.compile(r'\w+')
+MAX_TOKENS = 8
+TERM_LENGTH = PostTerm._meta.get_field('term').max_length
+# Вес слова из текста поста и из названия группы (bm25 и PostTerm).
+TEXT_WEIGHT, GROUP_WEIGHT = 2, 1
+NORMALIZED_SQL = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+# Слово TermStats, под которым хранится число проиндексированных постов:
+# токенизатор пустых слов не выдаёт.
+DOCUMENTS = ''
+# Столько слов за раз в term IN (...): SQLite ограничивает число
+# параметров запроса.
+TERMS_BATCH = 500
+
+
+def normalize(text):
+    # Ё пишут через раз: в индексе и в запросах это одна буква.
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(normalize(text).lower())
+            if len(token) <= TERM_LENGTH]
+
+
+@lru_cache(maxsize=None)
+def _has_fts(database):
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def backend():
+    """'fts5' или 'python' — по настройке SEARCH_BACKEND и базе."""
+    name = settings.SEARCH_BACKEND
+    if name == 'auto':
+        has_fts = _has_fts(connection.settings_dict['NAME'])
+        return 'fts5' if has_fts else 'python'
+    return name
+
+
+def _group_title(post):
+    return post.group.title if post.group_id else ''
+
+
+def post_terms(post):
+    weights = Counter()
+    for text, weight in ((post.text, TEXT_WEIGHT),
+                         (_group_title(post), GROUP_WEIGHT)):
+        for token in tokenize(text):
+            weights[token] += weight
+    return weights
+
+
+def index_post(post):
+    """Обновить пост в индексе после сохранения."""
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [post.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, group_title) '
+                'VALUES (%s, %s, %s)',
+                [post.pk, normalize(post.text), normalize(_group_title(post))])
+        return
+    weights = post_terms(post)
+    with atomic_write():
+        old = set(PostTerm.objects.filter(post=post).values_list(
+            'term', flat=True))
+        PostTerm.objects.filter(post=post).delete()
+        PostTerm.objects.bulk_create(
+            PostTerm(post=post, term=term, weight=min(weight, 32767))
+            for term, weight in weights.items())
+        new = set(weights)
+        if new and not old:
+            new.add(DOCUMENTS)
+        elif old and not new:
+            old.add(DOCUMENTS)
+        count_terms(new - old, 1)
+        count_terms(old - new, -1)
+
+
+def count_terms(terms, delta):
+    """Атомарно изменить число постов со словами terms на delta."""
+    terms = sorted(terms)
+    for start in range(0, len(terms), TERMS_BATCH):
+        batch = terms[start:start + TERMS_BATCH]
+        stats = TermStats.objects.filter(term__in=batch)
+        if delta > 0:
+            TermStats.objects.bulk_create(
+                [TermStats(term=term) for term in batch],
+                ignore_conflicts=True)
+        else:
+            stats = stats.filter(posts__gte=-delta)
+        stats.update(posts=F('posts') + delta)
+
+
+def forget_terms(post_id):
+    """Вычесть слова поста из TermStats до каскадного удаления PostTerm."""
+    if backend() == 'fts5':
+        return
+    terms = set(PostTerm.objects.filter(post_id=post_id).values_list(
+        'term', flat=True))
+    if terms:
+        count_terms(terms | {DOCUMENTS}, -1)
+
+
+def unindex_post(post_id):
+    # Строки PostTerm удаляются каскадом вместе с постом (см. forget_terms).
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [post_id])
+
+
+def rebuild():
+    """Построить индекс заново, например после массовой загрузки."""
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            text, title = (NORMALIZED_SQL.format(column)
+                           for column in ('p.text', "coalesce(g.title, '')"))
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, group_title) '
+                f'SELECT p.id, {text}, {title} '
+                f'FROM {Post._meta.db_table} p '
+                f'LEFT JOIN {Group._meta.db_table} g ON g.id = p.group_id')
+        return
+    PostTerm.objects.all().delete()
+    TermStats.objects.all().delete()
+    batch = []
+    frequencies = Counter()
+    documents = 0
+    for post in Post.objects.select_related('group').iterator():
+        weights = post_terms(post)
+        batch += [PostTerm(post=post, term=term, weight=min(weight, 32767))
+                  for term, weight in weights.items()]
+        frequencies.update(weights.keys())
+        documents += bool(weights)
+        if len(batch) >= 5000:
+            PostTerm.objects.bulk_create(batch)
+            batch = []
+    PostTerm.objects.bulk_create(batch)
+    frequencies[DOCUMENTS] = documents
+    TermStats.objects.bulk_create(
+        TermStats(term=term, posts=posts)
+        for term, posts in frequencies.items())
+
+
+class SearchResults(ABC):
+    """Найденные посты в порядке релевантности; годится для Paginator.
+
+    Каждое слово запроса ищется как префикс: «кот» найдёт и «коты».
+    Число результатов ограничено SEARCH_RESULTS_LIMIT, чтобы частые
+    слова не заставляли считать весь индекс.
+    """
+
+    def __init__(self, query):
+        self.tokens = tokenize(query)[:MAX_TOKENS]
+        self.limit = settings.SEARCH_RESULTS_LIMIT
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.count_matches() if self.tokens else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = min(index.stop or self.limit, self.limit)
+        if not self.tokens or start >= stop:
+            return []
+        ids = self.ranked_ids(start, stop - start)
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    @abstractmethod
+    def count_matches(self):
+        """Число совпадений, не больше self.limit."""
+
+    @abstractmethod
+    def ranked_ids(self, offset, limit):
+        """Id постов от самых релевантных, срез [offset:offset + limit]."""
+
+
+class FtsResults(SearchResults):
+    def match(self):
+        return ' '.join(f'"{token}"*' for token in self.tokens)
+
+    def count_matches(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM (SELECT 1 FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s LIMIT %s)',
+                [self.match(), self.limit])
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, offset, limit):
+        # bm25 считается только для самых новых совпадений: по частому
+        # слову не приходится оценивать весь индекс.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'AND rowid >= coalesce((SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s ORDER BY rowid DESC '
+                'LIMIT 1 OFFSET %s), 0) '
+                f'ORDER BY bm25({FTS_TABLE}, {TEXT_WEIGHT}, {GROUP_WEIGHT}), '
+                'rowid DESC LIMIT %s OFFSET %s',
+                [self.match(), self.match(), self.limit - 1, limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class TermResults(SearchResults):
+    """Поиск по PostTerm: пост должен содержать все слова, счёт — TF-IDF.
+
+    Частоты слов берутся из TermStats. Как и bm25 в FtsResults,
+    ранжируются только самые новые посты с самым редким словом запроса:
+    частые слова не заставляют перебирать весь индекс.
+    """
+
+    def ranges(self):
+        # Диапазон вместо LIKE: так SQLite и PostgreSQL идут по индексу.
+        return [Q(term__gte=token, term__lt=token + '\uffff')
+                for token in self.tokens]
+
+    def frequencies(self, ranges):
+        """Число всех постов и постов с каждым словом — одним запросом.
+
+        Для префикса складываются частоты его форм: это оценка сверху,
+        для IDF её достаточно.
+        """
+        documents = Q(term=DOCUMENTS)
+        found = TermStats.objects.filter(
+            documents | self.any_range(ranges)).aggregate(
+                total=Sum('posts', filter=documents),
+                **{f'token{number}': Sum('posts', filter=condition)
+                   for number, condition in enumerate(ranges)})
+        total = found.pop('total') or 1
+        return total, [min(found[f'token{number}'] or 0, total)
+                       for number in range(len(ranges))]
+
+    @staticmethod
+    def any_range(ranges):
+        any_range = ranges[0]
+        for condition in ranges[1:]:
+            any_range |= condition
+        return any_range
+
+    def newest_candidate(self, condition):
+        """Id самого старого из limit новейших постов с этим словом."""
+        ids = PostTerm.objects.filter(condition).order_by(
+            '-post_id').values_list('post_id', flat=True).distinct()
+        return next(iter(ids[self.limit - 1:self.limit]), 0)
+
+    @cached_property
+    def matches(self):
+        ranges = self.ranges()
+        total, found = self.frequencies(ranges)
+        token = Case(*(When(condition, then=Value(number))
+                       for number, condition in enumerate(ranges)),
+                     output_field=IntegerField())
+        idf = Case(*(When(condition, then=Value(self.idf(frequency, total)))
+                     for condition, frequency in zip(ranges, found)),
+                   output_field=FloatField())
+        rarest = min(zip(found, ranges), key=lambda pair: pair[0])[1]
+        return PostTerm.objects.filter(
+            self.any_range(ranges),
+            post_id__gte=self.newest_candidate(rarest),
+        ).values('post_id').annotate(
+            matched=Count(token, distinct=True),
+            score=Sum(F('weight') * idf, output_field=FloatField()),
+        ).filter(matched=len(ranges)).order_by()
+
+    @staticmethod
+    def idf(found, total):
+        return math.log(1 + total / (found or 1))
+
+    def count_matches(self):
+        return self.matches[:self.limit].count()
+
+    def ranked_ids(self, offset, limit):
+        return list(self.matches.order_by('-score', '-post_id').values_list(
+            'post_id', flat=True)[offset:offset + limit])
+
+
+def search(query):
+    if backend() == 'fts5':
+        return FtsResults(query)
+    return TermResults(query)
@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import feed, jobs, live, search
+from .caching import invalidate, post_feeds
+from .models import Comment, Follow, Group, Post, UserStats
+
+# Побочные эффекты записей выполняются задачами очереди (см. jobs):
+# обработчик сигнала только ставит задачу с id и нужными полями.
+
+
+@jobs.register
+def post_created(post_id, author_id):
+    UserStats.objects.add(author_id, posts_count=1)
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'author_id', 'pub_date').first()
+    if post is not None:
+        feed.fan_out(post)
+
+
+@jobs.register
+def post_changed(post_id, feeds):
+    post = Post.objects.select_related('group').filter(pk=post_id).first()
+    if post is not None:
+        search.index_post(post)
+    invalidate(*feeds)
+
+
+@jobs.register
+def post_removed(post_id, author_id, feeds):
+    UserStats.objects.add(author_id, posts_count=-1)
+    search.unindex_post(post_id)
+    invalidate(*feeds)
+
+
+@jobs.register
+def group_renamed(group_id):
+    # Название группы тоже ищется: переиндексируем её посты.
+    posts = Post.objects.filter(group_id=group_id).select_related('group')
+    for post in posts.iterator():
+        search.index_post(post)
+    # Название есть на карточках: сбросим все ленты, где они показаны.
+    authors = Post.objects.filter(group_id=group_id).order_by().values_list(
+        'author_id', flat=True).distinct()
+    invalidate('index', f'group:{group_id}',
+               *(f'profile:{author_id}' for author_id in authors))
+
+
+@jobs.register
+def comment_counted(post_id, delta):
+    if delta > 0:
+        Post.objects.filter(pk=post_id).update(
+            comment_count=F('comment_count') + delta)
+    else:
+        Post.objects.filter(pk=post_id, comment_count__gt=0).update(
+            comment_count=F('comment_count') + delta)
+    # Пост мог удалиться вместе с комментариями: тогда сбрасывать нечего.
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'group_id').first()
+    if post is not None:
+        invalidate(*post_feeds(post['author_id'], post['group_id']))
+
+
+@jobs.register
+def follow_changed(user_id, author_id, delta):
+    UserStats.objects.add(author_id, followers_count=delta)
+    UserStats.objects.add(user_id, following_count=delta)
+    follow = Follow(user_id=user_id, author_id=author_id)
+    if delta < 0:
+        feed.prune(follow)
+        feed.restore_fan_out(author_id)
+    elif Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        feed.backfill(follow)
+    invalidate(f'profile:{author_id}', f'profile:{user_id}')
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        jobs.enqueue(post_created, instance.pk, instance.author_id)
+        transaction.on_commit(lambda: live.publish_post(instance))
+    jobs.enqueue(post_changed, instance.pk, post_feeds(
+        instance.author_id, instance.group_id, instance._loaded_group_id))
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Счётчики слов меняются в транзакции удаления, пока строки PostTerm
+    # ещё не удалены каскадом.
+    search.forget_terms(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    jobs.enqueue(post_removed, instance.pk, instance.author_id,
+                 post_feeds(instance.author_id, instance.group_id))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        jobs.enqueue(group_renamed, instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        jobs.enqueue(comment_counted, instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    jobs.enqueue(comment_counted, instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        jobs.enqueue(follow_changed, instance.user_id, instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    jobs.enqueue(follow_changed, instance.user_id, instance.author_id, -1)
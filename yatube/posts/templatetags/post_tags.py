@@ -0,0 +1,23 @@
+from django import template
+from django.conf import settings
+
+from ..caching import render_post_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Карточки постов ленты: готовая разметка из кэша одним get_many."""
+    return render_post_cards(posts, context.get('user'))
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    return render_post_cards([post], context.get('user'))
+
+
+@register.inclusion_tag('includes/live.html')
+def live_banner(query):
+    """Баннер «Новых записей» на потоке SSE, если LIVE_FEEDS включены."""
+    return {'enabled': settings.LIVE_FEEDS, 'query': query}
@@ -0,0 +1,102 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+@override_settings(QUANTITY_PAGE=2)
+class FeedApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Writer')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.posts = [
+            Post.objects.create(text=f'Пост {number}', author=self.author,
+                                group=self.group)
+            for number in range(3)
+        ]
+
+    def get(self, url, **headers):
+        return self.client.get(url, **headers)
+
+    def test_feeds(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        urls = (reverse('api:index'),
+                reverse('api:group_posts', args=['group']),
+                reverse('api:profile', args=['Writer']),
+                reverse('api:follow_index'))
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.get(url).json()
+                self.assertEqual([post['text'] for post in data['results']],
+                                 ['Пост 2', 'Пост 1'])
+                post = data['results'][0]
+                self.assertEqual(post['author'], 'Writer')
+                self.assertEqual(post['group'], 'group')
+                self.assertEqual(post['url'], reverse(
+                    'post', args=['Writer', self.posts[2].pk]))
+
+    def test_follow_feed_requires_login(self):
+        self.assertEqual(self.get(reverse('api:follow_index')).status_code,
+                         401)
+
+    def test_cursors(self):
+        """next ведёт к старым постам, previous — к новым для опроса."""
+        url = reverse('api:index')
+        first = self.get(url).json()
+        older = self.get(url, data={'cursor': first['next']}).json()
+        self.assertEqual([post['text'] for post in older['results']],
+                         ['Пост 0'])
+        self.assertIsNone(older['next'])
+        poll = self.get(url, data={'cursor': first['previous']}).json()
+        self.assertEqual(poll['results'], [])
+        self.assertEqual(poll['previous'], first['previous'])
+        Post.objects.create(text='Новый пост', author=self.author)
+        poll = self.get(url, data={'cursor': first['previous']}).json()
+        self.assertEqual([post['text'] for post in poll['results']],
+                         ['Новый пост'])
+        self.assertEqual(self.get(url, data={'cursor': '!'}).status_code,
+                         400)
+
+    def test_conditional_get(self):
+        url = reverse('api:index')
+        response = self.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_is_ignored(self):
+        """Правка не меняет дату публикации: IMS не должен давать 304."""
+        url = reverse('api:index')
+        last_modified = self.get(url)['Last-Modified']
+        post = self.posts[2]
+        post.text = 'Исправленный пост'
+        post.save()
+        response = self.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['text'],
+                         'Исправленный пост')
+
+    def test_etag_changes_with_content(self):
+        """Новый пост, правка и комментарий меняют ETag."""
+        url = reverse('api:index')
+        etags = [self.get(url)['ETag']]
+        post = self.posts[2]
+        post.text = 'Исправленный пост'
+        post.save()
+        etags.append(self.get(url)['ETag'])
+        Comment.objects.create(text='Комментарий', post=post,
+                               author=self.reader)
+        etags.append(self.get(url)['ETag'])
+        Post.objects.create(text='Новый пост', author=self.author)
+        etags.append(self.get(url)['ETag'])
+        self.assertEqual(len(set(etags)), len(etags))
@@ -0,0 +1,129 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase
+
+from ..models import Comment, FeedEntry, Follow, Group, Post, User
+
+
+class BenchmarkIndexesTest(TestCase):
+    def test_benchmark_rolls_back(self):
+        """Бенчмарк индексов печатает планы и ничего не оставляет в базе."""
+        out = StringIO()
+        call_command('benchmark_indexes', seed=30, repeat=1, stdout=out)
+        self.assertIn('USING INDEX post_pub_date', out.getvalue())
+        self.assertIn('USE TEMP B-TREE FOR ORDER BY', out.getvalue())
+        self.assertFalse(Post.objects.exists())
+
+
+class SeedDataTest(TestCase):
+    def seed(self, **options):
+        options = dict(users=30, groups=3, posts=300, comments=200,
+                       follows=100, batch_size=50, stdout=StringIO(),
+                       **options)
+        call_command('seed_data', **options)
+
+    def test_seed_creates_consistent_data(self):
+        """Сид создаёт данные и сразу чинит счётчики и ленты подписок."""
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertTrue(Follow.objects.exists())
+        call_command('rebuild_counters', verify=True, stdout=StringIO())
+        follow = Follow.objects.first()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=follow.user, author=follow.author).exists())
+        for comment in Comment.objects.select_related('post'):
+            self.assertGreaterEqual(comment.created, comment.post.pub_date)
+
+    def test_authors_follow_power_law(self):
+        """Самый активный автор пишет в разы больше медианного."""
+        self.seed(no_feeds=True)
+        counts = sorted(Post.objects.values_list('author').annotate(
+            total=Count('id')).order_by().values_list('total', flat=True))
+        self.assertGreater(counts[-1], 3 * counts[len(counts) // 2])
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_seed_is_reproducible(self):
+        """С тем же зерном сид создаёт те же данные."""
+        self.seed()
+        first = list(Post.objects.order_by('pk').values_list(
+            'text', 'author__username'))
+        Post.objects.all().delete()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed()
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'author__username')), first)
+
+    def test_prefix_must_be_new(self):
+        """Повторный сид с тем же префиксом отказывается от работы."""
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+
+class BenchmarkViewsTest(TestCase):
+    def setUp(self):
+        call_command('seed_data', users=20, groups=2, posts=50, comments=20,
+                     follows=40, stdout=StringIO())
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        self.baseline = os.path.join(directory, 'baseline.json')
+        self.addCleanup(os.remove, self.baseline)
+
+    def benchmark(self, *views, **options):
+        out = StringIO()
+        call_command('benchmark_views', *views, no_setup=True, concurrency=1,
+                     requests=3, warmup=1, baseline=self.baseline,
+                     stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_baseline_round_trip(self):
+        """Эталон сохраняется, а рост числа SQL-запросов — регрессия."""
+        out = self.benchmark(save_baseline=True)
+        for view in ('index', 'post_view', 'new_post'):
+            self.assertIn(view, out)
+        with open(self.baseline) as baseline:
+            results = json.load(baseline)
+        self.assertEqual(results['add_comment']['errors'], 0)
+        self.assertIn('Регрессий нет',
+                      self.benchmark('index', tolerance=100))
+        results['index']['queries'] = 0
+        with open(self.baseline, 'w') as baseline:
+            json.dump(results, baseline)
+        with self.assertRaisesMessage(CommandError, 'index: SQL 0'):
+            self.benchmark('index', tolerance=100)
+
+
+class BenchmarkAsgiTest(TransactionTestCase):
+    def test_servers_are_compared(self):
+        """Каждая лента замеряется через WSGI и ASGI, с gather и без."""
+        call_command('seed_data', users=10, groups=2, posts=20, comments=10,
+                     follows=10, stdout=StringIO())
+        out = StringIO()
+        call_command('benchmark_asgi', 'index', 'post_view', no_setup=True,
+                     requests=4, workers=2, concurrency=4, warmup=0,
+                     latency=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 9)
+        self.assertEqual(lines[8].split()[:2], ['post_view', 'asgi+gather'])
+        for line in lines[1:]:
+            self.assertEqual(line.split()[-1], '0')
+
+
+class BenchmarkSqliteTest(TestCase):
+    def test_profiles_are_compared(self):
+        out = StringIO()
+        call_command('benchmark_sqlite', seconds=0.2, rows=10, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        performance = lines[2].split()
+        self.assertEqual(performance[0], 'performance')
+        self.assertEqual(performance[-1], '0')
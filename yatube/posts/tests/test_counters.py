@@ -0,0 +1,77 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post, User, UserStats
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def stats(self, user):
+        return UserStats.objects.for_user(
+            User.objects.select_related('stats').get(pk=user.pk))
+
+    def test_post_and_comment_counters(self):
+        """Новые пост и комментарий увеличивают счётчики."""
+        self.author_client.post(reverse('new_post'), {'text': 'Пост'})
+        post = Post.objects.get(text='Пост')
+        self.reader_client.post(
+            reverse('add_comment', kwargs={'username': 'Author',
+                                           'post_id': post.id}),
+            {'text': 'Комментарий'})
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        url = reverse('profile_follow', kwargs={'username': 'Author'})
+        self.reader_client.get(url)
+        self.reader_client.get(url)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        response = self.reader_client.get(
+            reverse('profile', kwargs={'username': 'Author'}))
+        self.assertContains(response, 'Подписчиков: 1')
+        self.reader_client.get(
+            reverse('profile_unfollow', kwargs={'username': 'Author'}))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_rebuild_counters(self):
+        """Команда находит и исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Post.objects.filter(pk=post.pk).update(comment_count=5)
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', verify=True, stdout=StringIO())
+        call_command('rebuild_counters', stdout=StringIO())
+        call_command('rebuild_counters', verify=True, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_rebuild_counters_for_many_users(self):
+        """Пересчёт не упирается в лимиты одного INSERT в SQLite."""
+        User.objects.bulk_create(
+            User(username=f'user_{number}') for number in range(600))
+        users = User.objects.filter(username__startswith='user_')
+        Post.objects.bulk_create(Post(text='Пост', author=user)
+                                 for user in users)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(UserStats.objects.filter(
+            user__in=users, posts_count=1).count(), 600)
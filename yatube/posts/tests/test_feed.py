@@ -0,0 +1,80 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import FeedEntry, Follow, Post, User
+
+
+class FollowFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Author')
+        cls.other = User.objects.create_user(username='Other')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed_texts(self, **params):
+        response = self.reader_client.get(reverse('follow_index'), params)
+        return [post.text for post in response.context['page']]
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост автора попадает в ленты его подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        Post.objects.create(text='Чужой пост', author=self.other)
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.feed_texts(), ['Новый пост'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет старые посты автора, отписка убирает их."""
+        Post.objects.create(text='Старый пост', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed_texts(), ['Старый пост'])
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed_texts(), [])
+
+    def test_fan_out_to_many_followers(self):
+        """Пост раскладывается по сотням лент пачками нужного размера."""
+        User.objects.bulk_create(
+            User(username=f'reader_{number}') for number in range(600))
+        Follow.objects.bulk_create(
+            Follow(user=user, author=self.author)
+            for user in User.objects.filter(username__startswith='reader_'))
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(FeedEntry.objects.filter(post=post).count(), 600)
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_read_on_request(self):
+        """Посты автора с большой аудиторией не раскладываются по лентам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed_texts(), ['Пост звезды'])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_posts_are_fanned_out_when_author_is_no_longer_celebrity(self):
+        """Посты, вышедшие при большой аудитории, возвращаются в ленты."""
+        Post.objects.create(text='Пост до славы', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertEqual(self.feed_texts(), ['Пост звезды', 'Пост до славы'])
+        Follow.objects.filter(user=self.other).delete()
+        self.assertEqual(
+            set(FeedEntry.objects.filter(user=self.reader).values_list(
+                'post__text', flat=True)), {'Пост звезды', 'Пост до славы'})
+        self.assertEqual(self.feed_texts(), ['Пост звезды', 'Пост до славы'])
+
+    def test_feed_cursor_pages(self):
+        """Лента подписок листается курсором."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        for number in range(12):
+            Post.objects.create(text=f'Пост {number}', author=self.author)
+        response = self.reader_client.get(reverse('follow_index'))
+        cursor = response.context['page'].next_cursor
+        self.assertEqual(self.feed_texts(cursor=cursor), ['Пост 1', 'Пост 0'])
@@ -1,11 +1,18 @@
+import os
 import shutil
 import tempfile
+from io import BytesIO, StringIO
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
+from PIL import Image
 
+from .. import thumbnails
 from ..models import Group, Post, User
 
 TEMP_MEDIA = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -61,3 +68,154 @@ class TestPostImageFormTests(TestCase):
             with self.subTest(reverse_name=reverse_name):
                 response = self.authorized_client.get(reverse_name)
                 self.assertContains(response, '<img')
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """До нарезки миниатюры показывается заглушка, потом миниатюра."""
+        cache.clear()
+        url = reverse('post', kwargs={'username': self.user.username,
+                                      'post_id': self.post.id})
+        self.assertContains(self.authorized_client.get(url),
+                            'Изображение обрабатывается')
+        name = thumbnails.generate(self.post.id)
+        response = self.authorized_client.get(url)
+        self.assertNotContains(response, 'Изображение обрабатывается')
+        self.assertContains(response, settings.MEDIA_URL + name)
+
+    def test_generate_thumbnails_command(self):
+        """Команда нарезает недостающие миниатюры."""
+        call_command('generate_thumbnails', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnail)
+
+
+def image_file(name, size, image_format, **options):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA)
+class ImageUploadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, image):
+        return self.client.post(reverse('new_post'),
+                                {'text': 'Фото', 'image': image})
+
+    def test_metadata_is_stripped_and_rotation_applied(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90°
+        exif[0x010F] = 'Камера'
+        self.upload(image_file('photo.jpg', (40, 20), 'JPEG',
+                               exif=exif.tobytes()))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/photo.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertEqual(dict(image.getexif()), {})
+
+    @override_settings(IMAGE_MAX_WIDTH=30)
+    def test_other_formats_are_reencoded_and_downscaled(self):
+        self.upload(image_file('scan.bmp', (60, 10), 'BMP'))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/scan.webp')
+        with Image.open(post.image.path) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (30, 5)))
+
+    @override_settings(IMAGE_MAX_WIDTH=30)
+    def test_animation_is_downscaled_and_stripped(self):
+        """Анимация перекодируется по кадрам: уже и без метаданных."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        for image_format, metadata in (('GIF', {'comment': b'secret'}),
+                                       ('WEBP', {'exif': exif.tobytes()})):
+            with self.subTest(image_format=image_format):
+                frames = [Image.new('RGB', (60, 20), color)
+                          for color in ('red', 'green', 'blue')]
+                buffer = BytesIO()
+                frames[0].save(buffer, image_format, save_all=True,
+                               append_images=frames[1:], duration=50,
+                               loop=0, **metadata)
+                name = f'cat.{image_format.lower()}'
+                self.upload(SimpleUploadedFile(name, buffer.getvalue()))
+                post = Post.objects.latest('pk')
+                self.assertEqual(post.image.name, f'posts/{name}')
+                with Image.open(post.image.path) as image:
+                    self.assertEqual(image.format, image_format)
+                    self.assertEqual(image.n_frames, 3)
+                    self.assertEqual(image.size, (30, 10))
+                    self.assertNotIn('comment', image.info)
+                    self.assertNotIn('exif', image.info)
+                    image.seek(2)
+                    image.load()
+                    self.assertEqual(image.info['duration'], 50)
+
+    def test_limits(self):
+        for limits in ({'IMAGE_MAX_PIXELS': 100}, {'IMAGE_MAX_BYTES': 10}):
+            with self.subTest(**limits), override_settings(**limits):
+                response = self.upload(image_file('big.png', (20, 20), 'PNG'))
+                self.assertTrue(response.context['form'].errors['image'])
+        with override_settings(IMAGE_MAX_PIXELS=1000):
+            # Каждый кадр 20×20 в лимите, а все пять вместе — нет.
+            response = self.upload(image_file(
+                'long.gif', (20, 20), 'GIF', save_all=True,
+                append_images=[Image.new('L', (20, 20), shade)
+                               for shade in range(0, 200, 50)]))
+            self.assertTrue(response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.exists())
+
+    def test_variants_in_srcset(self):
+        """Варианты режутся не шире картинки и попадают в srcset."""
+        self.upload(image_file('wide.png', (1000, 400), 'PNG'))
+        post = Post.objects.get()
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        widths = [variant.split()[1] for variant in post.variants.split(',')]
+        self.assertEqual(widths, ['480w', '960w'])
+        self.assertTrue(post.thumbnail.name.endswith('.webp'))
+        cache.clear()
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, f'srcset="{post.srcset}"')
+        self.assertIn(f'{post.thumbnail.url} 960w', post.srcset)
+
+    def test_same_image_shares_blob_and_thumbnails(self):
+        for _ in range(2):
+            self.upload(image_file('meme.png', (600, 300), 'PNG'))
+        first, second = Post.objects.order_by('pk')
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertTrue(os.path.samefile(first.image.path,
+                                         second.image.path))
+        for post in (first, second):
+            thumbnails.generate(post.pk)
+            post.refresh_from_db()
+        self.assertEqual(first.thumbnail.name, second.thumbnail.name)
+        self.assertEqual(first.variants, second.variants)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA, JOBS_EAGER=True,
+                   JOBS_EAGER_WORKERS=0)
+class ThumbnailAfterCommitTest(TransactionTestCase):
+    # Миниатюра режется только после коммита, поэтому без транзакции
+    # TestCase; JOBS_EAGER_WORKERS = 0 — в потоке запроса, чтобы тест
+    # не ждал фоновый пул.
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_thumbnail_is_generated_after_commit(self):
+        user = User.objects.create_user(username='photographer')
+        client = Client()
+        client.force_login(user)
+        client.post(reverse('new_post'), {
+            'text': 'Фото', 'image': image_file('cat.png', (600, 300), 'PNG')})
+        self.assertTrue(Post.objects.get().thumbnail)
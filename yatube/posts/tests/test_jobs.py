@@ -0,0 +1,141 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import jobs
+from ..models import FeedEntry, Follow, Job, Post, User, UserStats
+from ..search import search
+
+
+THREADS = []
+
+
+@jobs.register
+def broken():
+    raise RuntimeError('Сломалось')
+
+
+@jobs.register
+def remember_thread():
+    THREADS.append(threading.current_thread().name)
+
+
+@override_settings(JOBS_EAGER=False)
+class JobQueueTest(TransactionTestCase):
+    # Воркер выполняет задачи в своём потоке: строки должны быть
+    # закоммичены, поэтому без транзакции TestCase.
+    def setUp(self):
+        self.author = User.objects.create_user(username='Writer')
+        self.reader = User.objects.create_user(username='Reader')
+        self.client = Client()
+
+    def process(self):
+        out = StringIO()
+        call_command('process_jobs', once=True, workers=1, stdout=out)
+        return out.getvalue()
+
+    def test_side_effects_wait_for_worker(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.author)
+        self.client.post(reverse('new_post'), {'text': 'Отложенный пост'})
+        post = Post.objects.get()
+        self.client.post(reverse('add_comment', args=['Writer', post.pk]),
+                         {'text': 'Комментарий'})
+        self.assertFalse(UserStats.objects.filter(posts_count=1).exists())
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertTrue(Job.objects.filter(status=Job.PENDING).exists())
+        self.assertIn('с ошибкой: 0', self.process())
+        self.assertEqual(UserStats.objects.get(user=self.author).posts_count,
+                         1)
+        self.assertEqual(UserStats.objects.get(
+            user=self.author).followers_count, 1)
+        self.assertTrue(FeedEntry.objects.filter(user=self.reader,
+                                                 post=post).exists())
+        self.assertEqual(Post.objects.get().comment_count, 1)
+        self.assertEqual(list(search('отложенный')), [post])
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+        self.assertFalse(Job.objects.filter(duration=None).exists())
+
+    def test_stats(self):
+        Post.objects.create(text='Пост', author=self.author)
+        self.process()
+        out = StringIO()
+        call_command('process_jobs', stats=True, stdout=out)
+        self.assertIn('posts.signals.post_created', out.getvalue())
+
+
+@override_settings(JOBS_EAGER=True, JOBS_EAGER_WORKERS=1)
+class EagerJobTest(TransactionTestCase):
+    def setUp(self):
+        THREADS.clear()
+        self.addCleanup(jobs.reset)
+
+    def test_job_after_commit_runs_in_background(self):
+        """Задача после коммита не занимает поток запроса."""
+        with transaction.atomic():
+            jobs.enqueue(remember_thread, on_commit=True)
+            self.assertEqual(THREADS, [])
+        jobs.reset()
+        self.assertEqual(len(THREADS), 1)
+        self.assertTrue(THREADS[0].startswith('jobs'))
+
+    def test_failed_job_after_commit_is_logged(self):
+        """Сбой задачи после коммита не ломает уже выполненный запрос."""
+        with self.assertLogs('posts.jobs', 'ERROR'):
+            with transaction.atomic():
+                jobs.enqueue(broken, on_commit=True)
+            jobs.reset()
+        with override_settings(JOBS_EAGER_WORKERS=0):
+            with self.assertLogs('posts.jobs', 'ERROR'):
+                with transaction.atomic():
+                    jobs.enqueue(broken, on_commit=True)
+
+
+@override_settings(JOB_MAX_ATTEMPTS=2, JOB_RETRY_DELAY=60)
+class JobRetryTest(TestCase):
+    def enqueue(self, name):
+        return Job.objects.create(name=name, run_after=timezone.now())
+
+    def run_failing(self, job):
+        with self.assertLogs('posts.jobs', 'ERROR'):
+            self.assertFalse(jobs.run(job))
+
+    def test_failed_job_is_retried_then_failed(self):
+        job = self.enqueue(jobs.name_of(broken))
+        self.run_failing(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('Сломалось', job.error)
+        self.assertGreater(job.run_after,
+                           timezone.now() + timedelta(seconds=50))
+        self.assertEqual(jobs.claim(10), [])
+        self.run_failing(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_unregistered_job_is_not_called(self):
+        job = self.enqueue('os.getcwd')
+        self.run_failing(job)
+        with self.assertRaises(ValueError):
+            jobs.enqueue(print)
+
+    def test_done_is_committed_with_side_effects(self):
+        job = self.enqueue(jobs.name_of(remember_thread))
+        self.assertEqual(jobs.claim(10), [job])
+        self.assertTrue(jobs.run(job))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 1))
+
+    def test_expired_lease_is_claimed_again(self):
+        job = self.enqueue(jobs.name_of(broken))
+        self.assertEqual(jobs.claim(10), [job])
+        self.assertEqual(jobs.claim(10), [])
+        Job.objects.update(run_after=timezone.now())
+        self.assertEqual(jobs.claim(10), [job])
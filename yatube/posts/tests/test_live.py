@@ -0,0 +1,125 @@
+import threading
+import time
+
+from django.core.cache import cache, caches
+from django.test import (Client, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from .. import live
+from ..models import Follow, Group, Post, User
+
+
+class LocalBrokerTest(SimpleTestCase):
+    def make_broker(self):
+        return live.LocalBroker()
+
+    def setUp(self):
+        self.broker = self.make_broker()
+
+    def test_listen_filters_channels(self):
+        start = self.broker.last_id()
+        self.broker.publish('index', {'id': 1})
+        self.broker.publish('group:1', {'id': 2})
+        events, last_id = self.broker.listen({'group:1'}, start, 0)
+        self.assertEqual([data for _, _, data in events], [{'id': 2}])
+        self.assertEqual(last_id, self.broker.last_id())
+        self.assertEqual(self.broker.listen({'group:1'}, last_id, 0)[0], [])
+
+    def test_listener_wakes_up_on_publish(self):
+        """Слушатель получает событие сразу, а не по истечении ожидания."""
+        start = self.broker.last_id()
+        timer = threading.Timer(
+            0.05, self.broker.publish, ['index', {'id': 1}])
+        timer.start()
+        started = time.monotonic()
+        events, _ = self.broker.listen({'index'}, start, 5)
+        timer.join()
+        self.assertEqual(len(events), 1)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_last_id_from_previous_broker(self):
+        """Last-Event-ID больше номера брокера: события не теряются."""
+        self.broker.publish('index', {'id': 1})
+        events, last_id = self.broker.listen(
+            {'index'}, self.broker.last_id() + 100, 0)
+        self.assertEqual([data for _, _, data in events], [{'id': 1}])
+        self.assertEqual(last_id, self.broker.last_id())
+
+    @override_settings(LIVE_BROKER='local')
+    def test_broker_follows_settings(self):
+        """После смены настроек LIVE_* брокер создаётся заново."""
+        with override_settings(LIVE_HISTORY=2):
+            self.assertEqual(live.broker().events.maxlen, 2)
+        with override_settings(LIVE_HISTORY=3):
+            self.assertEqual(live.broker().events.maxlen, 3)
+
+
+@override_settings(LIVE_POLL_INTERVAL=0.01)
+class CacheBrokerTest(LocalBrokerTest):
+    def make_broker(self):
+        caches['shared'].clear()
+        return live.CacheBroker()
+
+
+@override_settings(LIVE_FEEDS=True, LIVE_STREAM_TIMEOUT=0.1,
+                   LIVE_KEEPALIVE=0.05)
+class LiveFeedViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Writer')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        self.client = Client()
+        self.start = live.broker().last_id()
+
+    def events(self, **params):
+        response = self.client.get(reverse('live_feed'), params,
+                                   HTTP_LAST_EVENT_ID=str(self.start))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_feeds_receive_their_posts(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   group=self.group)
+        other = Post.objects.create(text='Другой', author=self.reader)
+        live.publish_post(post)
+        live.publish_post(other)
+        for params in ({}, {'feed': 'group', 'slug': 'group'},
+                       {'feed': 'follow'}):
+            with self.subTest(**params):
+                body = self.events(**params)
+                self.assertIn(f'"id": {post.pk}', body)
+                self.assertEqual(body.count('event: new_post'),
+                                 1 + (params == {}))
+
+    def test_idle_stream_sends_keepalive(self):
+        self.assertIn(': keepalive', self.events())
+
+    def test_banner_follows_setting(self):
+        """Без LIVE_FEEDS лента не открывает поток, а адрес потока — 404."""
+        cache.clear()
+        self.assertContains(self.client.get(reverse('index')), 'js-live')
+        with override_settings(LIVE_FEEDS=False):
+            cache.clear()
+            self.assertNotContains(self.client.get(reverse('index')),
+                                   'js-live')
+            response = self.client.get(reverse('live_feed'))
+            self.assertEqual(response.status_code, 404)
+
+    def test_follow_feed_requires_login(self):
+        response = self.client.get(reverse('live_feed'), {'feed': 'follow'})
+        self.assertEqual(response.status_code, 401)
+
+
+class PublishOnCommitTest(TransactionTestCase):
+    def test_new_post_is_published_after_commit(self):
+        author = User.objects.create_user(username='Writer')
+        start = live.broker().last_id()
+        post = Post.objects.create(text='Пост', author=author)
+        events, _ = live.broker().listen({'index'}, start, 0)
+        self.assertEqual([data['id'] for _, _, data in events], [post.pk])
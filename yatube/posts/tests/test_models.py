@@ -1,6 +1,6 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-from ..models import Group, Post, User
+from ..models import Comment, Group, Post, User
 
 
 class PostModelTest(TestCase):
@@ -24,3 +24,52 @@ class PostModelTest(TestCase):
         post = self.post
         expected_object_name = post.text[:15]
         self.assertEqual(expected_object_name, str(post))
+
+
+class CommentThreadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+
+    def comment(self, text, parent=None):
+        return Comment.objects.create(text=text, author=self.user,
+                                      post=self.post, parent=parent)
+
+    def test_paths(self):
+        """Путь ответа — путь родителя и собственный id."""
+        root = self.comment('Корень')
+        reply = self.comment('Ответ', root)
+        self.assertEqual(root.path, f'{root.pk:010d}')
+        self.assertEqual(reply.path, root.path + f'{reply.pk:010d}')
+        self.assertEqual(Comment.objects.get(pk=reply.pk).path, reply.path)
+        self.assertEqual((root.depth, reply.depth), (0, 1))
+
+    def test_subtrees_in_thread_order(self):
+        first, second = self.comment('Первый'), self.comment('Второй')
+        first_reply = self.comment('Ответ первому', first)
+        self.comment('Ответ второму', second)
+        self.comment('Ответ на ответ', first_reply)
+        self.comment('Ещё ответ первому', first)
+        with self.assertNumQueries(1):
+            texts = [comment.text
+                     for comment in Comment.objects.subtrees(first)]
+        self.assertEqual(texts, ['Ответ первому', 'Ответ на ответ',
+                                 'Ещё ответ первому'])
+        self.assertEqual(Comment.objects.subtrees().count(), 0)
+
+    @override_settings(COMMENT_MAX_DEPTH=1)
+    def test_max_depth(self):
+        """Ответ на самый глубокий комментарий встаёт с ним рядом."""
+        root = self.comment('Корень')
+        reply = self.comment('Ответ', root)
+        deeper = self.comment('Ответ на ответ', reply)
+        self.assertEqual(deeper.parent, root)
+        self.assertEqual(deeper.depth, 1)
+
+    def test_root_paths_after_bulk_create(self):
+        Comment.objects.bulk_create([
+            Comment(text='Из bulk_create', author=self.user, post=self.post)])
+        Comment.objects.set_root_paths()
+        comment = Comment.objects.get()
+        self.assertEqual(comment.path, f'{comment.pk:010d}')
@@ -0,0 +1,143 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import search
+from ..models import Group, Post, PostTerm, TermStats, User
+
+
+class SearchTest(TestCase):
+    backend = 'fts5'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Writer')
+
+    def setUp(self):
+        self.group = Group.objects.create(title='Кошки и коты', slug='cats')
+        settings = override_settings(SEARCH_BACKEND=self.backend)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = Client()
+
+    def found(self, query, **params):
+        response = self.client.get(reverse('search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [post.text for post in response.context['page']]
+
+    def test_backend(self):
+        """SEARCH_BACKEND выбирает реализацию поиска."""
+        self.assertEqual(search.backend(), self.backend)
+
+    def test_finds_words_by_prefix(self):
+        """Слова запроса ищутся как префиксы, нужны все слова."""
+        Post.objects.create(text='Рыжий котёнок спит', author=self.user)
+        Post.objects.create(text='Рыжий пёс спит', author=self.user)
+        self.assertEqual(self.found('котёнок'), ['Рыжий котёнок спит'])
+        self.assertEqual(self.found('КОТ'), ['Рыжий котёнок спит'])
+        self.assertEqual(len(self.found('рыжий спит')), 2)
+        self.assertEqual(self.found('рыжий кот'), ['Рыжий котёнок спит'])
+        self.assertEqual(self.found('жираф'), [])
+        self.assertEqual(self.found('   '), [])
+
+    def test_text_ranks_above_group_title(self):
+        """Совпадение в тексте важнее совпадения в названии группы."""
+        Post.objects.create(text='Про погоду', author=self.user,
+                            group=self.group)
+        Post.objects.create(text='Коты', author=self.user)
+        self.assertEqual(self.found('коты'), ['Коты', 'Про погоду'])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Правка, смена группы и удаление поста обновляют индекс."""
+        post = Post.objects.create(text='Черновик', author=self.user)
+        post.text = 'Итоговый текст'
+        post.save()
+        self.assertEqual(self.found('черновик'), [])
+        self.assertEqual(self.found('итоговый'), ['Итоговый текст'])
+        post.group = self.group
+        post.save()
+        self.group.title = 'Собаки'
+        self.group.save()
+        self.assertEqual(self.found('собаки'), ['Итоговый текст'])
+        post.delete()
+        self.assertEqual(self.found('итоговый'), [])
+
+    def test_pagination_keeps_query(self):
+        """Ссылки на страницы результатов сохраняют запрос."""
+        for number in range(12):
+            Post.objects.create(text=f'Заметка {number}', author=self.user)
+        response = self.client.get(reverse('search'), {'q': 'заметка'})
+        self.assertContains(response, '?q=%D0%B7%D0%B0%D0%BC%D0%B5%D1%82'
+                                      '%D0%BA%D0%B0&page=2')
+        self.assertEqual(len(self.found('заметка', page=2)), 2)
+
+    @override_settings(SEARCH_RESULTS_LIMIT=5)
+    def test_results_are_capped(self):
+        """Результатов не больше SEARCH_RESULTS_LIMIT."""
+        for number in range(8):
+            Post.objects.create(text=f'Заметка {number}', author=self.user)
+        response = self.client.get(reverse('search'), {'q': 'заметка'})
+        self.assertEqual(response.context['page'].paginator.count, 5)
+
+    def test_rebuild_index(self):
+        """rebuild_search_index находит посты, созданные без сигналов."""
+        Post.objects.bulk_create([Post(text='Без сигналов', author=self.user)])
+        self.assertEqual(self.found('сигналов'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('сигналов'), ['Без сигналов'])
+
+
+class TermSearchTest(SearchTest):
+    """Те же проверки для запасного индекса в таблице PostTerm."""
+    backend = 'python'
+
+    def test_terms_are_stored(self):
+        """Веса слов из текста и из названия группы."""
+        post = Post.objects.create(text='Кот кот и пёс', author=self.user,
+                                   group=self.group)
+        weights = dict(post.terms.values_list('term', 'weight'))
+        self.assertEqual(weights['кот'], 2 * search.TEXT_WEIGHT)
+        self.assertEqual(weights['коты'], search.GROUP_WEIGHT)
+        self.assertFalse(PostTerm.objects.exclude(post=post).exists())
+
+    def stats(self):
+        return dict(TermStats.objects.filter(posts__gt=0).values_list(
+            'term', 'posts'))
+
+    def test_term_stats_follow_index(self):
+        """Частоты слов ведутся вместе с индексом и совпадают с rebuild."""
+        first = Post.objects.create(text='Кот и пёс', author=self.user)
+        second = Post.objects.create(text='Кот', author=self.user)
+        self.assertEqual(self.stats(),
+                         {search.DOCUMENTS: 2, 'кот': 2, 'и': 1, 'пес': 1})
+        first.text = 'Пёс'
+        first.save()
+        second.delete()
+        self.assertEqual(self.stats(), {search.DOCUMENTS: 1, 'пес': 1})
+        Post.objects.create(text='Коты', author=self.user, group=self.group)
+        maintained = self.stats()
+        search.rebuild()
+        self.assertEqual(self.stats(), maintained)
+
+    def test_query_count_does_not_grow_with_tokens(self):
+        """Частоты всех слов запроса читаются одним запросом."""
+        Post.objects.create(text='Рыжий котёнок спит', author=self.user)
+        counts = []
+        for query in ('рыжий', 'рыжий котёнок спит'):
+            with CaptureQueriesContext(connection) as queries:
+                self.found(query)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    @override_settings(SEARCH_RESULTS_LIMIT=3)
+    def test_only_newest_candidates_are_ranked(self):
+        """Ранжируются только новейшие посты с самым редким словом."""
+        for number in range(5):
+            Post.objects.create(text=f'Заметка {number}', author=self.user)
+        self.assertEqual(self.found('заметка'),
+                         ['Заметка 4', 'Заметка 3', 'Заметка 2'])
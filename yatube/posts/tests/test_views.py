@@ -1,10 +1,16 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.paginator import InvalidPage, Page
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Follow, Group, Post
+from ..caching import EDIT_BUTTON_MARKER, post_card_key, render_post_cards
+from ..models import Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -137,6 +143,114 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(
                     response.context.get('page').object_list), 3)
 
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу."""
+        for template, reverse_name in self.templates_pages_names.items():
+            with self.subTest(template=template):
+                first = self.client.get(reverse_name).context['page']
+                response = self.client.get(
+                    reverse_name, {'cursor': first.next_cursor})
+                second = response.context['page']
+                self.assertEqual(len(second.object_list), 3)
+                self.assertIsNone(second.next_cursor)
+                self.assertEqual(second.object_list[0].text,
+                                 'Тестовый пост номер 2')
+                response = self.client.get(
+                    reverse_name, {'cursor': second.previous_cursor})
+                self.assertEqual(response.context['page'].object_list,
+                                 first.object_list)
+                self.assertIsNone(response.context['page'].previous_cursor)
+
+    def test_cursor_page_navigation(self):
+        """Страница по курсору отвечает на has_next, как и нумерованная."""
+        url = reverse('index')
+        first = self.client.get(url).context['page']
+        self.assertIs(type(first), Page)
+        self.assertTrue(first.has_next())
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_other_pages())
+        with self.assertRaises(InvalidPage):
+            first.next_page_number()
+        second = self.client.get(url, {'cursor': first.next_cursor}).context[
+            'page']
+        self.assertFalse(second.has_next())
+        self.assertTrue(second.has_previous())
+
+    @override_settings(PAGINATOR_COUNT_LIMIT=10)
+    def test_page_numbers_are_capped(self):
+        """?page=N не глубже count_limit, дальше ведёт курсор."""
+        url = reverse('index')
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get(url, {'page': 2}).context['page']
+        self.assertEqual(page.number, 1)
+        self.assertFalse(any('OFFSET' in query['sql']
+                             for query in queries.captured_queries))
+        self.assertEqual(page.paginator.count, 10)
+        rest = self.client.get(url, {'cursor': page.next_cursor}).context[
+            'page']
+        self.assertEqual(len(rest.object_list), 3)
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(reverse('group_posts', kwargs={
+            'slug': self.group.slug}), {'cursor': 'мусор'})
+        self.assertEqual(len(response.context['page'].object_list), 10)
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.group = Group.objects.create(title='Группа', slug='queries')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.urls = (
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': cls.group.slug}),
+            reverse('profile', kwargs={'username': cls.author.username}),
+            reverse('follow_index'),
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def create_posts(self, number):
+        for index in range(number):
+            post = Post.objects.create(text=f'Пост {index}',
+                                       author=self.author, group=self.group)
+            Comment.objects.create(text='Комментарий', author=self.user,
+                                   post=post)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов к ленте не зависит от числа постов на странице."""
+        self.create_posts(1)
+        single = {url: self.count_queries(url) for url in self.urls}
+        self.create_posts(settings.QUANTITY_PAGE - 1)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), single[url])
+
+    def test_post_queries_do_not_depend_on_comments(self):
+        """Авторы комментариев к посту загружаются одним запросом."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        url = reverse('post', kwargs={'username': self.author.username,
+                                      'post_id': post.pk})
+        Comment.objects.create(text='Первый', author=self.user, post=post)
+        single = self.count_queries(url)
+        for index in range(5):
+            commenter = User.objects.create_user(username=f'commenter{index}')
+            Comment.objects.create(text='Ещё', author=commenter, post=post)
+        self.assertEqual(self.count_queries(url), single)
+
 
 class Cache(TestCase):
     @classmethod
@@ -162,6 +276,56 @@ class Cache(TestCase):
         self.assertEqual(response.context['page'][0].text, 'Тестовый пост')
 
 
+class FeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='CacheUser')
+        cls.post = Post.objects.create(author=cls.user, text='Первый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_new_post_invalidates_index(self):
+        """Новый пост сразу сбрасывает закэшированную главную."""
+        self.guest_client.get(reverse('index'))
+        self.assertIsNone(self.guest_client.get(reverse('index')).context)
+        Post.objects.create(author=self.user, text='Второй пост')
+        response = self.guest_client.get(reverse('index'))
+        self.assertEqual(response.context['page'][0].text, 'Второй пост')
+
+    def test_comment_invalidates_index(self):
+        """Новый комментарий сбрасывает закэшированную главную."""
+        self.guest_client.get(reverse('index'))
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_group_rename_invalidates_index(self):
+        """Новое название группы сразу видно на закэшированной главной."""
+        group = Group.objects.create(title='Старое название', slug='renamed')
+        Post.objects.create(author=self.user, text='В группе', group=group)
+        self.assertContains(self.guest_client.get(reverse('index')),
+                            'Старое название')
+        group.title = 'Новое название'
+        group.save()
+        self.assertContains(self.guest_client.get(reverse('index')),
+                            'Новое название')
+
+    def test_guest_and_user_pages_are_separate(self):
+        """Анонимы и пользователи не получают чужую копию страницы."""
+        self.authorized_client.get(reverse('index'))
+        response = self.guest_client.get(reverse('index'))
+        self.assertIsNotNone(response.context)
+        self.assertNotContains(response, 'Редактировать')
+        response = self.authorized_client.get(reverse('index'))
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'Редактировать')
+
+
 class TestFollow(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -234,3 +398,246 @@ class TestComments(TestCase):
                                              {'text': 'Тестовый коммент'},
                                              follow=True)
         self.assertContains(response, 'Тестовый коммент')
+
+
+@override_settings(COMMENTS_PER_PAGE=2)
+class CommentPagesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Writer')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        for number in range(5):
+            Comment.objects.create(text=f'Комментарий {number}',
+                                   author=cls.user, post=cls.post)
+        cls.url = reverse('post', args=['Writer', cls.post.pk])
+        cls.more_url = reverse('post_comments', args=['Writer', cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def texts(self, response):
+        return [comment.text for comment in response.context['comments']]
+
+    def test_post_page_shows_first_comments(self):
+        response = self.client.get(self.url)
+        self.assertEqual(self.texts(response),
+                         ['Комментарий 4', 'Комментарий 3'])
+        self.assertContains(response, 'Показать ещё')
+
+    def test_load_more(self):
+        """Кнопка догружает следующие пачки, пока комментарии не кончатся."""
+        cursor = self.client.get(self.url).context['comments'].next_cursor
+        texts = []
+        while cursor:
+            response = self.client.get(self.more_url, {'cursor': cursor})
+            self.assertTemplateUsed(response, 'includes/comment_list.html')
+            texts += self.texts(response)
+            cursor = response.context['comments'].next_cursor
+        self.assertEqual(texts, ['Комментарий 2', 'Комментарий 1',
+                                 'Комментарий 0'])
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_post_page_accepts_comment_cursor(self):
+        """Без JavaScript кнопка ведёт на страницу поста с курсором."""
+        cursor = self.client.get(self.url).context['comments'].next_cursor
+        response = self.client.get(self.url, {'comments': cursor})
+        self.assertEqual(self.texts(response),
+                         ['Комментарий 2', 'Комментарий 1'])
+
+
+class CommentRepliesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Writer')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        cls.url = reverse('post', args=['Writer', cls.post.pk])
+        cls.comment_url = reverse('add_comment', args=['Writer', cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.root = Comment.objects.create(text='Корень', author=self.user,
+                                           post=self.post)
+
+    def test_reply(self):
+        """Ответ сохраняется в ветке и показывается под комментарием."""
+        response = self.client.get(self.url, {'reply': self.root.pk})
+        self.assertEqual(response.context['reply_to'], self.root)
+        self.assertEqual(len(response.context['form'].fields), 1)
+        self.client.post(self.comment_url,
+                         {'text': 'Ответ', 'parent': self.root.pk})
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual(reply.parent, self.root)
+        Comment.objects.create(text='Новый корень', author=self.user,
+                               post=self.post)
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Новый корень', 'Корень', 'Ответ'])
+
+    def test_foreign_parent_is_ignored(self):
+        other = Post.objects.create(text='Другой пост', author=self.user)
+        foreign = Comment.objects.create(text='Чужой', author=self.user,
+                                         post=other)
+        for parent in (foreign.pk, 'abc'):
+            with self.subTest(parent=parent):
+                self.client.post(self.comment_url,
+                                 {'text': f'Ответ {parent}',
+                                  'parent': parent})
+                reply = Comment.objects.get(text=f'Ответ {parent}')
+                self.assertIsNone(reply.parent)
+
+    @override_settings(COMMENT_REPLIES_PER_PAGE=3)
+    def test_replies_are_capped(self):
+        """Ответов в пачке не больше лимита, остальные догружаются."""
+        for number in range(5):
+            Comment.objects.create(text=f'Ответ {number}', author=self.user,
+                                   post=self.post, parent=self.root)
+        newer = Comment.objects.create(text='Новый корень', author=self.user,
+                                       post=self.post)
+        Comment.objects.create(text='Ответ новому', author=self.user,
+                               post=self.post, parent=newer)
+        comments = self.client.get(self.url).context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Новый корень', 'Корень', 'Ответ 0', 'Ответ 1', 'Ответ 2'])
+        self.assertEqual(
+            [comment.more_replies for comment in comments
+             if getattr(comment, 'more_replies', None)],
+            [f'thread={newer.pk}&after={newer.path}',
+             f'thread={self.root.pk}&after={comments[4].path}'])
+        more_url = reverse('post_comments', args=['Writer', self.post.pk])
+        response = self.client.get(
+            f'{more_url}?{comments[4].more_replies}')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Ответ 3', 'Ответ 4'])
+        self.assertContains(
+            self.client.get(f'{more_url}?{comments[0].more_replies}'),
+            'Ответ новому')
+
+    def test_queries_do_not_depend_on_replies(self):
+        def count():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(self.url)
+            return len(queries)
+
+        single = count()
+        parent = self.root
+        for number in range(4):
+            parent = Comment.objects.create(
+                text=f'Ответ {number}', author=self.user, post=self.post,
+                parent=parent)
+        self.assertEqual(count(), single)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Writer')
+        cls.reader = User.objects.create_user(username='Reader')
+
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.post = Post.objects.create(text='Пост', author=self.author,
+                                        group=self.group)
+        self.client = Client()
+        self.urls = (reverse('profile', args=['Writer']),
+                     reverse('post', args=['Writer', self.post.pk]))
+
+    def etags(self):
+        return [self.client.get(url)['ETag'] for url in self.urls]
+
+    def test_unchanged_pages_are_not_modified(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            with CaptureQueriesContext(connection) as queries:
+                again = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(again.status_code, 304)
+            self.assertLessEqual(len(queries), 3)
+            self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_changes_reset_etag(self):
+        """Правка, комментарий, подписка и другой зритель меняют ETag."""
+        def edit():
+            self.post.text = 'Правка'
+            self.post.save()
+
+        def rename():
+            self.group.title = 'Новое название'
+            self.group.save()
+
+        changes = {
+            'edit': edit,
+            'comment': lambda: Comment.objects.create(
+                text='Комментарий', post=self.post, author=self.reader),
+            'delete comment': lambda: Comment.objects.all().delete(),
+            'follow': lambda: Follow.objects.create(
+                user=self.reader, author=self.author),
+            'login': lambda: self.client.force_login(self.reader),
+            'group rename': rename,
+        }
+        for name, change in changes.items():
+            before = self.etags()
+            change()
+            after = self.etags()
+            for url, old, new in zip(self.urls, before, after):
+                with self.subTest(change=name, url=url):
+                    self.assertNotEqual(old, new)
+
+    def test_missing_author(self):
+        response = self.client.get(reverse('profile', args=['Nobody']))
+        self.assertEqual(response.status_code, 404)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Writer')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(text='Пост', author=self.author)
+
+    def load(self):
+        return Post.objects.for_feed().get(pk=self.post.pk)
+
+    def test_cards_are_rendered_once(self):
+        posts = [self.load()]
+        with self.assertTemplateUsed('includes/post_item.html'):
+            render_post_cards(posts, self.reader)
+        with self.assertTemplateNotUsed('includes/post_item.html'):
+            render_post_cards(posts, self.author)
+
+    def test_edit_button_only_for_author(self):
+        """Кнопка редактирования не попадает в общий кэш."""
+        edit_url = reverse('post_edit', args=['Writer', self.post.pk])
+        posts = [self.load()]
+        self.assertIn(edit_url, render_post_cards(posts, self.author))
+        for user in (self.reader, AnonymousUser(), None):
+            with self.subTest(user=user):
+                html = render_post_cards(posts, user)
+                self.assertNotIn(edit_url, html)
+                self.assertNotIn(EDIT_BUTTON_MARKER, html)
+
+    def test_changes_reset_card(self):
+        keys = [post_card_key(self.load())]
+        self.post.text = 'Правка'
+        self.post.save()
+        keys.append(post_card_key(self.load()))
+        Comment.objects.create(text='Комментарий', post=self.post,
+                               author=self.reader)
+        keys.append(post_card_key(self.load()))
+        self.post.group = self.group
+        self.post.save()
+        keys.append(post_card_key(self.load()))
+        Group.objects.filter(pk=self.group.pk).update(title='Другая')
+        keys.append(post_card_key(self.load()))
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertIn('Правка', render_post_cards([self.load()], None))
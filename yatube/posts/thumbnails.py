@@ -0,0 +1,69 @@
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+from . import jobs
+from .caching import invalidate, post_feeds
+from .models import Post
+
+WIDTH = 960
+HEIGHT = 339
+OPTIONS = {'crop': 'center', 'format': 'WEBP'}
+
+
+def variant(image, width):
+    height = round(width * HEIGHT / WIDTH)
+    return get_thumbnail(image, f'{width}x{height}',
+                         upscale=width == WIDTH, **OPTIONS)
+
+
+def shared_source(image):
+    """Источник миниатюр: blob содержимого, если хранилище их ведёт.
+
+    sorl запоминает миниатюры по имени источника, поэтому посты с одной
+    и той же картинкой получают одни и те же уже нарезанные файлы.
+    """
+    storage = image.storage
+    if not hasattr(storage, 'blob_name'):
+        return image
+    digest = storage.digest(image.name)
+    # Файлы, сохранённые до dedupe_media, ещё не ссылаются на blob.
+    if not storage.refcount(digest):
+        return image
+    return storage.blob_name(digest)
+
+
+@jobs.register
+def generate(post_id):
+    """Нарезать миниатюру поста и её варианты по ширине для srcset.
+
+    Основная миниатюра шириной WIDTH есть всегда (маленькие картинки
+    растягиваются), а варианты шире самой картинки не режутся.
+    """
+    post = Post.objects.filter(pk=post_id).only(
+        'image', 'author_id', 'group_id').first()
+    if post is None or not post.image:
+        return None
+    source = shared_source(post.image)
+    thumbnail = variant(source, WIDTH)
+    variants = []
+    for width in settings.IMAGE_WIDTHS:
+        if width == WIDTH:
+            variants.append(f'{thumbnail.name} {width}w')
+        elif width < post.image.width:
+            variants.append(f'{variant(source, width).name} {width}w')
+    # Картинку могли заменить, пока мы резали старую.
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnail=thumbnail.name, variants=','.join(variants))
+    if updated:
+        invalidate(*post_feeds(post.author_id, post.group_id))
+    return thumbnail.name
+
+
+def schedule(post):
+    """Поставить нарезку миниатюры в очередь задач.
+
+    Без очереди (JOBS_EAGER) миниатюра режется после коммита в фоновом
+    пуле (JOBS_EAGER_WORKERS): не держит ни транзакцию, ни ответ.
+    """
+    if post.image:
+        jobs.enqueue(generate, post.pk, on_commit=True)
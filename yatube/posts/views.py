@@ -1,45 +1,159 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
+from yatube.concurrency import gather
+from yatube.sqlite.transaction import atomic_write
+
+from . import live, thumbnails
+from .caching import cache_feed_page, page_etag
+from .feed import as_posts, follow_feed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import PATH_STEP, Comment, Follow, Group, Post, User, UserStats
+from .paginator import CursorPaginator
+from .search import search as search_posts
+
+
+def feed_paginator(object_list, tiebreak='pk'):
+    return CursorPaginator(object_list, settings.QUANTITY_PAGE,
+                           tiebreak=tiebreak,
+                           count_limit=settings.PAGINATOR_COUNT_LIMIT)
+
+
+def get_page(request, paginator):
+    return paginator.get_page(request.GET.get('page'),
+                              request.GET.get('cursor'))
+
+
+def paginate(request, object_list, tiebreak='pk'):
+    return get_page(request, feed_paginator(object_list, tiebreak))
+
+
+def feed_page(request, paginator, *queries):
+    """Страница ленты, её приблизительный итог и другие запросы разом."""
+    page, _, *results = gather(
+        lambda: get_page(request, paginator),
+        lambda: paginator.approximate_count,
+        *queries)
+    return (page, *results)
 
 
-@cache_page(20, key_prefix='index_page')
+@cache_feed_page('index')
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.QUANTITY_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page, = feed_page(request, feed_paginator(Post.objects.for_feed()))
     return render(request, 'index.html', {'page': page, })
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search_posts(query), settings.QUANTITY_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    return render(request, 'search.html', {'page': page, 'query': query, })
+
+
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.QUANTITY_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    # Строки ленты выбираются по slug, не дожидаясь самой группы.
+    paginator = feed_paginator(Post.objects.for_feed().filter(
+        group__slug=slug))
+    page, group = feed_page(request, paginator,
+                            lambda: Group.objects.filter(slug=slug).first())
+    if group is None:
+        raise Http404('Группа не найдена')
     return render(request, 'group.html', {'page': page, 'group': group, })
 
 
+def more_replies(root, last):
+    # Параметры догрузки ветки root после комментария last.
+    last.more_replies = f'thread={root.pk}&after={last.path}'
+
+
+def comment_page(post_id, cursor=None):
+    """Пачка веток: до COMMENTS_PER_PAGE корневых комментариев с ответами.
+
+    Ответы всех веток пачки приходят одним запросом по путям, не больше
+    COMMENT_REPLIES_PER_PAGE. Ветки, где ответы не поместились, получают
+    кнопку догрузки (см. thread_replies).
+    """
+    roots = Comment.objects.filter(
+        post_id=post_id, parent=None).select_related('author')
+    paginator = CursorPaginator(roots, settings.COMMENTS_PER_PAGE,
+                                key='created')
+    page = paginator.get_page(cursor=cursor)
+    limit = settings.COMMENT_REPLIES_PER_PAGE
+    rows = list(Comment.objects.subtrees(*page.object_list).select_related(
+        'author')[:limit + 1])
+    replies = {}
+    for reply in rows[:limit]:
+        replies.setdefault(reply.path[:PATH_STEP], []).append(reply)
+    # Ответы идут по путям: обрезаны ветка первого невлезшего ответа и
+    # все ветки после неё, у которых ответы есть.
+    cut = rows[limit].path[:PATH_STEP] if len(rows) > limit else None
+    with_replies = set()
+    if cut is not None:
+        later = [root for root in page.object_list if root.path > cut]
+        with_replies = set(Comment.objects.filter(
+            parent__in=later).values_list('parent_id', flat=True))
+    comments = []
+    for root in page.object_list:
+        comments += [root, *replies.get(root.path, ())]
+        if root.path == cut or root.pk in with_replies:
+            more_replies(root, comments[-1])
+    page.object_list = comments
+    return page
+
+
+def thread_replies(post_id, root_id, after):
+    """Следующие COMMENT_REPLIES_PER_PAGE ответов ветки после пути after."""
+    root = Comment.objects.filter(post_id=post_id, parent=None,
+                                  pk=root_id).first()
+    if root is None or not after.startswith(root.path):
+        return []
+    limit = settings.COMMENT_REPLIES_PER_PAGE
+    replies = list(Comment.objects.subtrees(root).filter(
+        path__gt=after).select_related('author')[:limit + 1])
+    if len(replies) > limit:
+        replies = replies[:limit]
+        more_replies(root, replies[-1])
+    return replies
+
+
+def reply_to(post_id, comment_id):
+    """Комментарий поста, на который отвечают, или None."""
+    if not comment_id or not str(comment_id).isdigit():
+        return None
+    return Comment.objects.select_related('author').filter(
+        post_id=post_id, pk=comment_id).first()
+
+
+def author_etag(request, username, post_id=None):
+    # Правки постов, комментарии и подписки меняют поколение ленты автора.
+    # Last-Modified не отдаём: у поста нет даты правки, а по дате
+    # публикации правленая страница считалась бы неизменной.
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    if author_id is None:
+        return None
+    return page_etag(request, f'profile:{author_id}')
+
+
+@condition(etag_func=author_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
     user = request.user
-    user_posts = author.posts.all()
-    paginator = Paginator(user_posts, settings.QUANTITY_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    user_post_count = user_posts.count()
-    following = user.is_authenticated and (
-        Follow.objects.filter(user=user, author=author).exists())
+    following = (Follow.objects.filter(user=user, author=author).exists
+                 if user.is_authenticated else lambda: False)
+    page, following = feed_page(
+        request, feed_paginator(author.posts.for_feed()), following)
+    stats = UserStats.objects.for_user(author)
     context = {
         'author': author,
         'page': page,
-        'count': user_post_count,
+        'stats': stats,
+        'count': stats.posts_count,
         'following': following
     }
     return render(
@@ -49,16 +163,25 @@ def profile(request, username):
     )
 
 
+@condition(etag_func=author_etag)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post.objects.select_related('author'),
-                             id=post_id, author__username=username)
+    # Комментарии выбираются по id поста, не дожидаясь самого поста.
+    post, comments, reply = gather(
+        Post.objects.for_feed().select_related('author__stats').filter(
+            id=post_id, author__username=username).first,
+        lambda: comment_page(post_id, request.GET.get('comments')),
+        lambda: reply_to(post_id, request.GET.get('reply')))
+    if post is None:
+        raise Http404('Пост не найден')
     form = CommentForm()
-    comments = post.comments.all()
+    stats = UserStats.objects.for_user(post.author)
     context = {
         'post': post,
         'author': post.author,
-        'count': post.author.posts.count,
+        'stats': stats,
+        'count': stats.posts_count,
         'comments': comments,
+        'reply_to': reply,
         'form': form,
     }
     return render(
@@ -69,6 +192,7 @@ def post_view(request, username, post_id):
 
 
 @login_required
+@atomic_write
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
@@ -77,10 +201,29 @@ def new_post(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    thumbnails.schedule(post)
     return redirect('index')
 
 
+def post_comments(request, username, post_id):
+    """Следующая пачка комментариев для кнопки «Показать ещё».
+
+    С ?thread=<id>&after=<путь> — следующие ответы одной ветки.
+    """
+    post = get_object_or_404(Post.objects.select_related('author'),
+                             id=post_id, author__username=username)
+    thread = request.GET.get('thread', '')
+    if thread.isdigit():
+        comments = thread_replies(post.pk, int(thread),
+                                  request.GET.get('after', ''))
+    else:
+        comments = comment_page(post.pk, request.GET.get('cursor'))
+    return render(request, 'includes/comment_list.html',
+                  {'comments': comments, 'post': post})
+
+
 @login_required
+@atomic_write
 def post_edit(request, username, post_id):
     post_item = get_object_or_404(Post, id=post_id, author__username=username)
     if request.user != post_item.author:
@@ -91,7 +234,12 @@ def post_edit(request, username, post_id):
         return render(request, 'new_post.html',
                       {'form': form, 'switch': 'edit',
                        'post': post_item})
+    if 'image' in form.changed_data:
+        post_item.thumbnail = None
+        post_item.variants = ''
     form.save()
+    if 'image' in form.changed_data:
+        thumbnails.schedule(post_item)
     return redirect('post', username=username, post_id=post_id)
 
 
@@ -109,11 +257,11 @@ def server_error(request):
 
 
 @login_required
+@atomic_write
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
-    comments = post.comments.all()
-    form = CommentForm(
-        request.POST or None)
+    parent = reply_to(post.pk, request.POST.get('parent'))
+    form = CommentForm(request.POST or None, parent=parent)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
@@ -122,22 +270,52 @@ def add_comment(request, username, post_id):
         return redirect('post', post_id=post_id,
                         username=username)
     return render(request, 'includes/comments.html',
-                  {'form': form, 'comments': comments, 'post': post})
+                  {'form': form, 'comments': comment_page(post.pk),
+                   'post': post, 'reply_to': parent})
 
 
 @login_required
 def follow_index(request):
-    user = request.user
-    post_list = Post.objects.filter(author__following__user=user)
-    paginator = Paginator(post_list, settings.QUANTITY_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list, tiebreak = follow_feed(request.user)
+    page = paginate(request, post_list, tiebreak)
+    page.object_list = as_posts(page.object_list)
     return render(request, 'follow.html', {'page': page,
-                                           'paginator': paginator,
+                                           'paginator': page.paginator,
                                            })
 
 
+def live_feed(request):
+    """Поток SSE с id новых постов ленты вместо её перезагрузок.
+
+    ?feed=index (по умолчанию), ?feed=group&slug=<slug> или ?feed=follow.
+    Соединение почти всё время спит в брокере и не трогает базу, но
+    занимает поток сервера; без LIVE_FEEDS потока нет.
+    """
+    if not settings.LIVE_FEEDS:
+        raise Http404('Живые ленты выключены')
+    feed = request.GET.get('feed', 'index')
+    if feed == 'group':
+        group = get_object_or_404(Group, slug=request.GET.get('slug'))
+        channels = [f'group:{group.pk}']
+    elif feed == 'follow':
+        if not request.user.is_authenticated:
+            return HttpResponse(status=401)
+        channels = [f'author:{author_id}' for author_id in
+                    request.user.follower.values_list('author_id', flat=True)]
+    else:
+        channels = ['index']
+    last_id = request.META.get('HTTP_LAST_EVENT_ID', '')
+    last_id = int(last_id) if last_id.isdigit() else live.broker().last_id()
+    response = StreamingHttpResponse(live.stream(set(channels), last_id),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Не копить поток в буфере nginx.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
+@atomic_write
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -146,6 +324,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@atomic_write
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(author=author, user=request.user).delete()
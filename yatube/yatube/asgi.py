@@ -0,0 +1,39 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 has no ASGI handler of its own, so the WSGI application is
+wrapped with asgiref's WsgiToAsgi. This only lets an ASGI server host
+the synchronous application: every request, including a long-lived
+response such as the live feed stream, holds a thread of asgiref's
+``sync_to_async`` pool from start to finish, exactly as it would under
+a threaded WSGI server. It is not an async deployment path. Views gain
+concurrency only from running independent queries in parallel (see
+``yatube.concurrency``). Serve it with an ASGI server, e.g.::
+
+    uvicorn yatube.asgi:application --workers 4
+
+It exposes the ASGI callable as a module-level variable named
+``application``.
+"""
+
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+wsgi_application = get_wsgi_application()
+
+
+def closing_application(environ, start_response):
+    # WsgiToAsgi не вызывает close() у ответа, а Django по нему шлёт
+    # request_finished и закрывает устаревшие соединения с базой.
+    response = wsgi_application(environ, start_response)
+    try:
+        yield from response
+    finally:
+        response.close()
+
+
+application = WsgiToAsgi(closing_application)
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .instrumentation import record_cache
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+# add() файлового кэша не атомарен: внутри процесса блокировку
+# ключа дополнительно берём под обычным мьютексом.
+_add_lock = threading.Lock()
+
+
+def _prefix(key):
+    return key.split(':', 1)[0]
+
+
+def record(prefix, event, count=1):
+    with _stats_lock:
+        _stats[prefix, event] += count
+    record_cache(event)
+
+
+def stats():
+    """Попадания и промахи по префиксам ключей в этом процессе."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    result = {}
+    for (prefix, event), count in snapshot.items():
+        result.setdefault(prefix, Counter())[event] = count
+    return result
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш: L1 в памяти процесса, L2 общий для воркеров.
+
+    L2 — любой другой алиас из CACHES (файловый кэш, memcached).
+    L1 хранит значения не дольше LOCAL_TIMEOUT секунд, поэтому запись из
+    соседнего воркера становится видна не позже чем через это время;
+    LOCAL_TIMEOUT = 0 отключает L1. get_or_set защищён от «набега»: при
+    промахе значение вычисляет один воркер, остальные ждут его в L2.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 10)
+        self.lock_poll = options.get('LOCK_POLL', 0.05)
+        self.local = LocMemCache(location or 'tiered', {
+            'TIMEOUT': self.local_timeout,
+            'OPTIONS': {'MAX_ENTRIES': options.get('LOCAL_MAX_ENTRIES', 1000)},
+        })
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def _remember(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self.local_timeout:
+            self.local.set(key, value, self._local_timeout(timeout),
+                           version=version)
+
+    def get(self, key, default=None, version=None):
+        if self.local_timeout:
+            value = self.local.get(key, version=version)
+            if value is not None:
+                record(_prefix(key), 'l1_hits')
+                return value
+        value = self.shared.get(key, version=version)
+        if value is None:
+            record(_prefix(key), 'misses')
+            return default
+        record(_prefix(key), 'hits')
+        self._remember(key, value, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        if self.local_timeout:
+            found = self.local.get_many(keys, version=version)
+            for key in found:
+                record(_prefix(key), 'l1_hits')
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            for key in missing:
+                record(_prefix(key), 'hits' if key in shared else 'misses')
+            for key, value in shared.items():
+                self._remember(key, value, version=version)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._remember(key, value, timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            self._remember(key, value, timeout, version=version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._remember(key, value, timeout, version=version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(key, version=version)
+        self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        self.local.delete_many(keys, version=version)
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(key, version=version)
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def _acquire(self, lock_key, version):
+        with _add_lock:
+            return self.shared.add(lock_key, 1, self.lock_timeout,
+                                   version=version)
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.get(key, version=version)
+        if value is not None:
+            return value
+        if not callable(default):
+            return super().get_or_set(key, default, timeout, version)
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + self.lock_timeout
+        while not self._acquire(lock_key, version):
+            record(_prefix(key), 'lock_waits')
+            time.sleep(self.lock_poll)
+            value = self.get(key, version=version)
+            if value is not None:
+                return value
+            if time.monotonic() > deadline:
+                break
+        try:
+            value = default()
+            if value is not None:
+                self.set(key, value, timeout, version=version)
+            return value
+        finally:
+            self.shared.delete(lock_key, version=version)
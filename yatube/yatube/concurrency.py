@@ -0,0 +1,67 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+from . import instrumentation
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.QUERY_WORKERS,
+                                       thread_name_prefix='queries')
+    return _executor
+
+
+@receiver(setting_changed)
+def reset(setting=None, **kwargs):
+    """Остановить пул: следующий gather создаст его с новыми настройками."""
+    global _executor
+    if setting not in (None, 'QUERY_WORKERS', 'DATABASES'):
+        return
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def _call(func):
+    metrics = instrumentation.current()
+    with ExitStack() as stack:
+        if metrics is not None:
+            timer = instrumentation.QueryTimer(metrics)
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+        try:
+            return func()
+        finally:
+            # Поток пула не живёт в цикле запроса Django, поэтому здесь
+            # делается то же, что request_finished: соединение остаётся
+            # жить CONN_MAX_AGE (без повторных PRAGMA), а устаревшие и
+            # сломанные закрываются. Неоткрытые не трогаем: проверка
+            # открыла бы соединения ко всем базам и репликам.
+            for connection in connections.all():
+                if connection.connection is not None:
+                    connection.close_if_unusable_or_obsolete()
+
+
+def gather(*funcs):
+    """Результаты независимых функций представления, по порядку.
+
+    При CONCURRENT_QUERIES все, кроме первой, выполняются в пуле потоков
+    одновременно с ней: запрос ждёт самый медленный из запросов к базе,
+    а не их сумму. У каждого потока пула своё соединение; контекст
+    запроса (закрепление за основной базой, метрики) копируется в поток.
+    """
+    if not settings.CONCURRENT_QUERIES or len(funcs) < 2:
+        return [func() for func in funcs]
+    futures = [executor().submit(contextvars.copy_context().run, _call, func)
+               for func in funcs[1:]]
+    first = funcs[0]()
+    return [first, *(future.result() for future in futures)]
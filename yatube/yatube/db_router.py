@@ -0,0 +1,76 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+_state = ContextVar('replica_state', default=None)
+
+
+class ReplicaState:
+    """Куда читать в текущем запросе и были ли в нём записи.
+
+    Реплика выбирается один раз на запрос: все чтения запроса видят
+    одну и ту же копию данных.
+    """
+
+    def __init__(self, primary):
+        self.primary = primary
+        self.wrote = False
+        replicas = settings.DATABASE_REPLICAS
+        if primary or not replicas:
+            self.replica = PRIMARY
+        else:
+            self.replica = random.choice(replicas)
+
+
+def start(primary):
+    state = ReplicaState(primary)
+    return state, _state.set(state)
+
+
+def finish(token):
+    _state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Читать с основной базы внутри блока."""
+    state, token = start(primary=True)
+    try:
+        yield state
+    finally:
+        finish(token)
+        parent = _state.get()
+        if parent is not None and state.wrote:
+            parent.wrote = True
+
+
+class ReplicaRouter:
+    """Чтение в запросах — с реплик из DATABASE_REPLICAS, запись — в default.
+
+    Запрос читает с основной базы, если он сам пишет (не GET/HEAD) или
+    если сессия недавно писала (см. ReplicaMiddleware). Код вне запросов
+    (команды, фоновые задачи) всегда работает с основной базой.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return PRIMARY
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными от основной базы.
+        return db not in settings.DATABASE_REPLICAS
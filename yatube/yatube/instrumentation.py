@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('request_metrics', default=None)
+
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+class RequestMetrics:
+    """Счётчики одного запроса: SQL, шаблоны, кэш."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.paused = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.templates = {}
+        self.cache = Counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def paused():
+    """Не считать SQL внутри блока в метриках текущего запроса.
+
+    Так выполняются задачи JOBS_EAGER: в бою их делает воркер, и в
+    бюджет представления они не входят.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.paused += 1
+    try:
+        yield
+    finally:
+        metrics.paused -= 1
+
+
+def record_cache(event):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache[event] += 1
+
+
+class QueryTimer:
+    """execute_wrapper, считающий запросы и их время."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.metrics.paused:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.metrics.sql_count += 1
+            self.metrics.sql_time += time.perf_counter() - started
+
+
+class TemplateTimer:
+    """Время рендеринга шаблонов; вложенные шаблоны не считаются дважды."""
+
+    def __init__(self):
+        self.metrics = _current.get()
+
+    def __enter__(self):
+        if self.metrics is not None:
+            self.metrics.template_depth += 1
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.metrics is not None:
+            self.metrics.template_depth -= 1
+            if not self.metrics.template_depth:
+                self.metrics.template_time += (
+                    time.perf_counter() - self.started)
+
+
+def record_template(name, elapsed):
+    """Время рендеринга шаблона с вложенными (при TEMPLATE_PROFILING)."""
+    metrics = _current.get()
+    if metrics is not None:
+        count, total = metrics.templates.get(name, (0, 0.0))
+        metrics.templates[name] = (count + 1, total + elapsed)
+
+
+def observe(metrics):
+    """Добавить запрос в гистограммы своего представления."""
+    elapsed_ms = metrics.elapsed * 1000
+    with _histograms_lock:
+        histogram = _histograms.setdefault(metrics.view, {
+            'count': 0, 'wall_ms': 0.0, 'sql_count': 0, 'sql_ms': 0.0,
+            'template_ms': 0.0, 'buckets': [0] * len(BUCKETS),
+            'templates': {},
+        })
+        histogram['count'] += 1
+        histogram['wall_ms'] += elapsed_ms
+        histogram['sql_count'] += metrics.sql_count
+        histogram['sql_ms'] += metrics.sql_time * 1000
+        histogram['template_ms'] += metrics.template_time * 1000
+        for name, (count, elapsed) in metrics.templates.items():
+            template = histogram['templates'].setdefault(
+                name, {'count': 0, 'ms': 0.0})
+            template['count'] += count
+            template['ms'] += elapsed * 1000
+        for index, bound in enumerate(BUCKETS):
+            if elapsed_ms <= bound:
+                histogram['buckets'][index] += 1
+                break
+
+
+def histograms():
+    with _histograms_lock:
+        snapshot = {
+            view: dict(data, buckets=list(data['buckets']), templates={
+                name: dict(template)
+                for name, template in data['templates'].items()})
+            for view, data in _histograms.items()
+        }
+    bounds = ['+Inf' if bound == float('inf') else bound
+              for bound in BUCKETS]
+    for data in snapshot.values():
+        data['buckets'] = dict(zip(map(str, bounds), data['buckets']))
+        # Сколько шаблон стоит одной странице этого представления.
+        for template in data['templates'].values():
+            template['ms_per_request'] = template['ms'] / data['count']
+    return snapshot
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
@@ -0,0 +1,89 @@
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import db_router, instrumentation
+
+logger = logging.getLogger('yatube.performance')
+
+PIN_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class InstrumentationMiddleware:
+    """Время представления, SQL, шаблонов и кэша для каждого запроса.
+
+    Итоги уходят в заголовок Server-Timing и в гистограммы процесса,
+    которые показывает /admin/metrics/. Представления, превысившие
+    QUERY_BUDGET запросов, попадают в лог yatube.performance.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics, token = instrumentation.start()
+        try:
+            with ExitStack() as stack:
+                timer = instrumentation.QueryTimer(metrics)
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            instrumentation.finish(token)
+        if metrics.view is None:
+            return response
+        instrumentation.observe(metrics)
+        response['Server-Timing'] = self.server_timing(metrics)
+        budget = settings.QUERY_BUDGET
+        if budget is not None and metrics.sql_count > budget:
+            logger.warning('%s: %d SQL-запросов при бюджете %d (%s)',
+                           metrics.view, metrics.sql_count, budget,
+                           request.path)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = instrumentation.current()
+        if metrics is not None:
+            metrics.view = f'{view_func.__module__}.{view_func.__name__}'
+
+    @staticmethod
+    def server_timing(metrics):
+        cache = metrics.cache
+        return ', '.join((
+            f'view;dur={metrics.elapsed * 1000:.1f}',
+            f'sql;desc="{metrics.sql_count} queries";'
+            f'dur={metrics.sql_time * 1000:.1f}',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+            f'cache;desc="hits={cache["hits"] + cache["l1_hits"]} '
+            f'misses={cache["misses"]}"',
+        ))
+
+
+class ReplicaMiddleware:
+    """Чтение своих записей при репликах с задержкой.
+
+    Запрос, который что-то записал (пост, комментарий, подписка, вход),
+    ставит cookie на REPLICA_LAG секунд; пока она жива, запросы этого
+    браузера, включая редирект после формы, читают с основной базы.
+    Должен стоять до SessionMiddleware, чтобы видеть запись сессии.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        primary = (request.method not in SAFE_METHODS
+                   or PIN_COOKIE in request.COOKIES)
+        state, token = db_router.start(primary)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.finish(token)
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_LAG,
+                                httponly=True, samesite='Lax')
+        return response
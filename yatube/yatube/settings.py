@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -48,7 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'yatube.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,12 +62,27 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+# Кэширующий загрузчик компилирует шаблон один раз на процесс (правки
+# файлов видны только после перезапуска); по умолчанию включён без DEBUG.
+# YATUBE_TEMPLATE_PROFILING=1 замеряет время каждого шаблона.
+TEMPLATE_CACHE = os.getenv('YATUBE_TEMPLATE_CACHE', str(int(not DEBUG))) == '1'
+TEMPLATE_PROFILING = os.getenv('YATUBE_TEMPLATE_PROFILING') == '1'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if TEMPLATE_CACHE:
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader',
+                         TEMPLATE_LOADERS)]
+if TEMPLATE_PROFILING:
+    TEMPLATE_LOADERS = [('yatube.template_backends.ProfilingLoader',
+                         TEMPLATE_LOADERS)]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.template_backends.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -81,13 +99,46 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Профиль SQLite: 'performance' — WAL, отложенный fsync, mmap, большой
+# кэш страниц, ожидание блокировок и постоянные соединения; 'default' —
+# настройки SQLite по умолчанию.
+SQLITE_PROFILE = os.getenv('YATUBE_SQLITE_PROFILE', 'performance')
+SQLITE_PROFILES = {
+    'default': {},
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+    },
+}
+SQLITE_PRAGMAS = SQLITE_PROFILES[SQLITE_PROFILE]
+SQLITE_IMMEDIATE_TRANSACTIONS = SQLITE_PROFILE == 'performance'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60 if SQLITE_PROFILE == 'performance' else 0,
     }
 }
 
+# Реплики для чтения. YATUBE_REPLICAS=N подключает N копий базы SQLite,
+# которые обновляет команда sync_replicas; на боевой базе реплики
+# описываются в DATABASES так же, с TEST MIRROR на default.
+for number in range(1, int(os.getenv('YATUBE_REPLICAS', 0)) + 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, f'db_replica{number}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['yatube.db_router.ReplicaRouter']
+# Сколько секунд после записи браузер читает с основной базы
+REPLICA_LAG = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -126,6 +177,20 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Одинаковые файлы хранятся один раз (см. yatube.storage)
+DEFAULT_FILE_STORAGE = 'yatube.storage.ContentAddressedStorage'
+
+# Загрузки больше 256 КБ пишутся во временный файл, а не в память
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+# Картинки постов: лимиты загрузки; форматы кроме JPEG, PNG, GIF и WebP
+# перекодируются в IMAGE_FORMAT
+IMAGE_MAX_BYTES = 10 * 2 ** 20
+IMAGE_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_MAX_WIDTH = 2560
+IMAGE_FORMAT = 'WEBP'
+IMAGE_QUALITY = 85
+# Ширины вариантов миниатюры для srcset; 960 — основная (Post.thumbnail)
+IMAGE_WIDTHS = (480, 960, 1440)
 
 # Login
 
@@ -137,9 +202,105 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
+# Общий кэш для нескольких воркеров: YATUBE_SHARED_CACHE=file или memcached.
+# По умолчанию L2 живёт в памяти процесса, а L1 отключён.
+SHARED_CACHE = os.environ.get('YATUBE_SHARED_CACHE', 'locmem')
+SHARED_CACHES = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION',
+                                   os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION',
+                                   '127.0.0.1:11211'),
+    },
+}
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'yatube.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_TIMEOUT': 0 if SHARED_CACHE == 'locmem' else 5,
+        },
+    },
+    'shared': SHARED_CACHES[SHARED_CACHE],
 }
 QUANTITY_PAGE = 10
+# Живые ленты (SSE). Каждый открытый поток занимает поток сервера на
+# LIVE_STREAM_TIMEOUT секунд, и asgi.py (WsgiToAsgi) здесь не помогает:
+# включайте только с потоковыми воркерами (gunicorn --threads или
+# --worker-class gthread), иначе несколько вкладок займут всех воркеров.
+LIVE_FEEDS = os.getenv('YATUBE_LIVE_FEEDS', '0') == '1'
+# 'local' — брокер внутри процесса, 'cache' — журнал событий в общем кэше
+# LIVE_CACHE, видимый всем воркерам.
+LIVE_BROKER = os.getenv('YATUBE_LIVE_BROKER', 'local')
+LIVE_CACHE = 'shared'
+# Сколько событий помнить для переподключения по Last-Event-ID
+LIVE_HISTORY = 100
+# Секунды: жизнь одного соединения, пинг, опрос журнала в кэше
+LIVE_STREAM_TIMEOUT = 60
+LIVE_KEEPALIVE = 15
+LIVE_POLL_INTERVAL = 0.5
+LIVE_RETRY_MS = 3000
+# Независимые запросы представлений (строки ленты, счётчик записей,
+# проверка подписки) выполняются одновременно в пуле из QUERY_WORKERS
+# потоков. Имеет смысл для сетевой базы: запросы к SQLite упираются в
+# процессор, а тестовая база в памяти не видна другим потокам.
+CONCURRENT_QUERIES = os.getenv('YATUBE_CONCURRENT_QUERIES') == '1'
+QUERY_WORKERS = 16
+# Сколько комментариев показывать на странице поста и догружать за раз
+COMMENTS_PER_PAGE = 50
+# Сколько ответов показывать за раз: всего на ветки пачки и при догрузке
+# одной ветки; остальные догружаются кнопкой в ветке
+COMMENT_REPLIES_PER_PAGE = 200
+# Глубина ответов: ответ на самый глубокий комментарий встаёт с ним рядом
+COMMENT_MAX_DEPTH = 5
+# Сколько записей считать для приблизительного итога в паджинаторе
+PAGINATOR_COUNT_LIMIT = 1000
+# Лента подписок: авторы с бóльшим числом подписчиков читаются при запросе
+FEED_FANOUT_LIMIT = 10000
+# Сколько последних постов автора добавлять в ленту при подписке
+FEED_BACKFILL_LIMIT = 500
+# Страницы лент живут в кэше, пока их не сбросит новый пост или комментарий
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Представления, сделавшие больше запросов к БД, попадают в лог
+QUERY_BUDGET = 20
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.performance': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
+# Побочные эффекты записей (миниатюры, ленты подписок, поиск, счётчики,
+# сброс кэша) — задачи в таблице Job, их выполняет process_jobs.
+# JOBS_EAGER выполняет их без воркера: сразу в запросе, а задачи после
+# коммита (миниатюры) — в фоновом пуле из JOBS_EAGER_WORKERS потоков.
+# По умолчанию включён только при DEBUG и в тестах: в бою побочные
+# эффекты не должны удлинять запрос записи.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+JOBS_EAGER = os.getenv('YATUBE_JOBS_EAGER',
+                       str(int(DEBUG or TESTING))) == '1'
+JOBS_EAGER_WORKERS = 2
+# Попыток до статуса failed; пауза перед повтором удваивается, секунды
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+# Аренда задачи воркером: после неё задачу упавшего воркера берёт другой
+JOB_TIMEOUT = 300
+JOB_POLL_INTERVAL = 1
+
+# Поиск: 'fts5' (SQLite FTS5), 'python' (таблица PostTerm) или 'auto'
+SEARCH_BACKEND = 'auto'
+# Больше этого числа результатов поиск не считает и не показывает
+SEARCH_RESULTS_LIMIT = 1000
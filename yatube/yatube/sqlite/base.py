@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Бэкенд SQLite с PRAGMA из SQLITE_PRAGMAS для каждого соединения.
+
+    При SQLITE_IMMEDIATE_TRANSACTIONS пишущие транзакции (atomic_write)
+    начинаются с BEGIN IMMEDIATE: такой запрос сразу занимает блокировку
+    записи и ждёт её до busy_timeout, а не падает с «database is
+    locked», когда другой запрос успел записать между его чтением и
+    записью. Транзакции только для чтения остаются отложенными.
+    """
+    immediate_transaction = False
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if (settings.SQLITE_IMMEDIATE_TRANSACTIONS
+                and self.immediate_transaction):
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
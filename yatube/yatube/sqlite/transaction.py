@@ -0,0 +1,27 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+class WriteAtomic(transaction.Atomic):
+    """Atomic, который просит бэкенд начать транзакцию с BEGIN IMMEDIATE."""
+
+    def __enter__(self):
+        connection = transaction.get_connection(self.using)
+        immediate = connection.immediate_transaction
+        connection.immediate_transaction = True
+        try:
+            super().__enter__()
+        finally:
+            connection.immediate_transaction = immediate
+
+
+def atomic_write(using=None, savepoint=True):
+    """transaction.atomic для блоков, которые пишут в базу.
+
+    На SQLite при SQLITE_IMMEDIATE_TRANSACTIONS такая транзакция сразу
+    берёт блокировку записи. Чтения в обычных atomic остаются
+    отложенными и не ждут пишущих. Вложенный блок транзакцию не
+    начинает, поэтому влияет только самый внешний.
+    """
+    if callable(using):
+        return WriteAtomic(DEFAULT_DB_ALIAS, savepoint)(using)
+    return WriteAtomic(using, savepoint)
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import time
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+BLOBS = 'blobs'
+CHUNK_SIZE = 64 * 1024
+# Недописанные загрузки старше этого возраста (с) считаются брошенными
+STALE_UPLOAD_AGE = 3600
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, где одинаковое содержимое хранится один раз.
+
+    Загрузка пишется во временный файл и по ходу хешируется (SHA-256),
+    затем становится blob'ом ``blobs/ab/cd/<хеш>``, если такого ещё нет.
+    Файл под обычным именем (``posts/meme.jpg``) — жёсткая ссылка на
+    blob: имена, URL и upload_to не меняются, а число ссылок на inode
+    служит счётчиком ссылок, который файловая система ведёт атомарно.
+    Удаление имени уменьшает счётчик; blob'ы без имён убирает
+    collect_garbage (команда dedupe_media).
+
+    MEDIA_ROOT должен быть на файловой системе с жёсткими ссылками.
+    """
+
+    def blob_name(self, digest):
+        return f'{BLOBS}/{digest[:2]}/{digest[2:4]}/{digest}'
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+            return
+        # os.makedirs применяет umask, как и в FileSystemStorage._save.
+        old_umask = os.umask(0)
+        try:
+            os.makedirs(directory, self.directory_permissions_mode,
+                        exist_ok=True)
+        finally:
+            os.umask(old_umask)
+
+    def _write_temporary(self, content):
+        """Записать содержимое рядом с blob'ами, считая хеш по пути."""
+        directory = self.path(BLOBS)
+        self._makedirs(directory)
+        digest = hashlib.sha256()
+        temporary = os.path.join(directory, f'.upload-{uuid.uuid4().hex}')
+        # Права как у обычного сохранения: 0o666 с учётом umask.
+        fd = os.open(temporary, self.OS_OPEN_FLAGS, 0o666)
+        with os.fdopen(fd, 'wb') as file:
+            for chunk in content.chunks(CHUNK_SIZE):
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                digest.update(chunk)
+                file.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(temporary, self.file_permissions_mode)
+        return digest.hexdigest(), temporary
+
+    def _link(self, source, name):
+        """Ссылка на source под свободным именем, начиная с name."""
+        while True:
+            path = self.path(name)
+            self._makedirs(os.path.dirname(path))
+            try:
+                os.link(source, path)
+            except FileExistsError:
+                name = self.get_available_name(name)
+            else:
+                return name
+
+    def _save(self, name, content):
+        digest, temporary = self._write_temporary(content)
+        blob = self.path(self.blob_name(digest))
+        self._makedirs(os.path.dirname(blob))
+        try:
+            try:
+                # Создаёт blob, только если такого ещё нет, — без гонок.
+                os.link(temporary, blob)
+            except FileExistsError:
+                pass
+            try:
+                name = self._link(blob, name)
+            except FileNotFoundError:
+                # Blob без имён успели убрать как мусор: восстановим его.
+                os.link(temporary, blob)
+                name = self._link(blob, name)
+        finally:
+            os.remove(temporary)
+        # Имена хранятся с прямыми слэшами, как в FileSystemStorage.
+        return name.replace('\\', '/')
+
+    def digest(self, name):
+        digest = hashlib.sha256()
+        with self.open(name) as file:
+            for chunk in file.chunks(CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def refcount(self, digest):
+        """Сколько имён ссылается на blob."""
+        try:
+            return os.stat(self.path(self.blob_name(digest))).st_nlink - 1
+        except FileNotFoundError:
+            return 0
+
+    def deduplicate(self, name):
+        """Сделать файл name ссылкой на blob; вернуть сэкономленные байты.
+
+        Для файлов, сохранённых до этого хранилища или мимо него.
+        """
+        path = self.path(name)
+        digest = self.digest(name)
+        blob = self.path(self.blob_name(digest))
+        self._makedirs(os.path.dirname(blob))
+        try:
+            os.link(path, blob)
+            return 0
+        except FileExistsError:
+            pass
+        if os.path.samefile(path, blob):
+            return 0
+        # Подменяем файл ссылкой атомарно: читатели видят старый или новый.
+        temporary = f'{path}.dedupe'
+        os.link(blob, temporary)
+        os.replace(temporary, path)
+        return os.path.getsize(blob)
+
+    def names(self):
+        """Все имена хранилища, кроме самих blob'ов."""
+        for root, directories, files in os.walk(self.location):
+            if root == self.location and BLOBS in directories:
+                directories.remove(BLOBS)
+            for file in files:
+                path = os.path.join(root, file)
+                yield os.path.relpath(path, self.location).replace('\\', '/')
+
+    def collect_garbage(self):
+        """Удалить blob'ы без имён и брошенные загрузки; вернуть их число."""
+        removed = 0
+        stale = time.time() - STALE_UPLOAD_AGE
+        for root, _, files in os.walk(self.path(BLOBS)):
+            for file in files:
+                path = os.path.join(root, file)
+                stat = os.stat(path)
+                if file.startswith('.upload-'):
+                    garbage = stat.st_mtime < stale
+                else:
+                    garbage = stat.st_nlink == 1
+                if garbage:
+                    os.remove(path)
+                    removed += 1
+        return removed
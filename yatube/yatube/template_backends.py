@@ -0,0 +1,80 @@
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template
+from django.template.loaders.base import Loader
+
+from .instrumentation import TemplateTimer, record_template
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        with TemplateTimer():
+            return super().render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Обычный движок Django, замеряющий время рендеринга шаблонов."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(
+            self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+class ProfiledTemplate:
+    """Скомпилированный шаблон, сообщающий время своего рендеринга."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def _timed(self, render, context):
+        started = time.perf_counter()
+        try:
+            return render(context)
+        finally:
+            record_template(self.template.name,
+                            time.perf_counter() - started)
+
+    def render(self, context):
+        return self._timed(self.template.render, context)
+
+    def _render(self, context):
+        # Так {% extends %} рендерит родительский шаблон.
+        return self._timed(self.template._render, context)
+
+
+class ProfilingLoader(Loader):
+    """Обёртка над загрузчиками для TEMPLATE_PROFILING.
+
+    Каждый шаблон, включая подключённые через {% include %},
+    {% extends %} и inclusion-теги, замеряет свой рендеринг вместе
+    с вложенными; итоги по представлениям показывает /admin/metrics/.
+    Должен быть внешним загрузчиком: кэширующий сам собирает шаблоны.
+    """
+
+    def __init__(self, engine, loaders):
+        super().__init__(engine)
+        self.loaders = engine.get_template_loaders(loaders)
+
+    def get_template(self, template_name, skip=None):
+        tried = []
+        for loader in self.loaders:
+            try:
+                template = loader.get_template(template_name, skip)
+            except TemplateDoesNotExist as error:
+                tried.extend(error.tried)
+            else:
+                return ProfiledTemplate(template)
+        raise TemplateDoesNotExist(template_name, tried=tried)
+
+    def reset(self):
+        for loader in self.loaders:
+            if hasattr(loader, 'reset'):
+                loader.reset()
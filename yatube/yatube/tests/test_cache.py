@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import TieredCache, reset_stats, stats
+
+SHARED_DIR = tempfile.mkdtemp()
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SHARED_DIR,
+    },
+})
+class TieredCacheTest(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(SHARED_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def worker(self, name, **options):
+        options.setdefault('LOCK_POLL', 0.01)
+        return TieredCache(name, {'OPTIONS': {'SHARED': 'shared', **options}})
+
+    def setUp(self):
+        self.first = self.worker('first')
+        self.second = self.worker('second')
+        self.first.clear()
+        self.second.clear()
+        reset_stats()
+
+    def test_workers_share_second_level(self):
+        """Значение, записанное одним воркером, видно другому."""
+        self.first.set('feed:key', 'value')
+        self.assertEqual(self.second.get('feed:key'), 'value')
+        self.assertEqual(self.second.get('feed:key'), 'value')
+        self.assertEqual(stats()['feed']['hits'], 1)
+        self.assertEqual(stats()['feed']['l1_hits'], 1)
+
+    def test_write_invalidates_own_first_level(self):
+        """incr и delete не оставляют устаревшее значение в L1."""
+        self.first.set('generation:index', 1)
+        self.assertEqual(self.first.get('generation:index'), 1)
+        self.first.incr('generation:index')
+        self.assertEqual(self.first.get('generation:index'), 2)
+        self.first.delete('generation:index')
+        self.assertIsNone(self.first.get('generation:index'))
+        self.assertEqual(stats()['generation']['misses'], 1)
+
+    def test_get_or_set_computes_once(self):
+        """При одновременном промахе значение вычисляется один раз."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'page'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda cache=cache: results.append(
+                cache.get_or_set('page:index', compute)))
+            for cache in (self.first, self.second, self.worker('third'))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['page'] * 3)
+        self.assertEqual(len(calls), 1)
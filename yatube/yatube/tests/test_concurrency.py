@@ -0,0 +1,57 @@
+import threading
+
+from django.test import (Client, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts.models import Follow, Post, User
+from .. import concurrency, instrumentation
+from ..concurrency import gather
+
+
+def thread_name():
+    return threading.current_thread().name
+
+
+class GatherTest(SimpleTestCase):
+    def setUp(self):
+        # Пул мог остаться от других тестов: начинаем с нового.
+        concurrency.reset()
+        self.addCleanup(concurrency.reset)
+
+    def test_sequential_by_default(self):
+        self.assertEqual(gather(thread_name, thread_name),
+                         [thread_name()] * 2)
+
+    @override_settings(CONCURRENT_QUERIES=True)
+    def test_concurrent_keeps_order_and_context(self):
+        """Функции идут в пуле, а метрики запроса видны и там."""
+        metrics, token = instrumentation.start()
+        self.addCleanup(instrumentation.finish, token)
+        names, others, *found = gather(
+            thread_name, thread_name, instrumentation.current, lambda: 3)
+        self.assertEqual(names, thread_name())
+        self.assertTrue(others.startswith('queries'))
+        self.assertEqual(found, [metrics, 3])
+
+
+@override_settings(CONCURRENT_QUERIES=True)
+class ConcurrentViewsTest(TransactionTestCase):
+    # Вне транзакции TestCase строки видны потокам пула.
+    def setUp(self):
+        self.author = User.objects.create_user(username='Writer')
+        self.reader = User.objects.create_user(username='Reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.post = Post.objects.create(text='Пост', author=self.author)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_views(self):
+        response = self.client.get(reverse('profile', args=['Writer']))
+        self.assertEqual(list(response.context['page']), [self.post])
+        self.assertTrue(response.context['following'])
+        response = self.client.get(
+            reverse('post', args=['Writer', self.post.pk]))
+        self.assertEqual(response.context['post'], self.post)
+        response = self.client.get(reverse('group_posts', args=['none']))
+        self.assertEqual(response.status_code, 404)
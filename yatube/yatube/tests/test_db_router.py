@@ -0,0 +1,72 @@
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from posts.models import Post
+
+from .. import db_router
+from ..middleware import PIN_COOKIE, ReplicaMiddleware
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTest(SimpleTestCase):
+    def handle(self, method='get', cookies=None, write=False):
+        """Прогнать запрос через middleware и вернуть базу для чтения."""
+        routed = []
+
+        def view(request):
+            routed.append(router.db_for_read(Post))
+            if write:
+                router.db_for_write(Post)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        response = ReplicaMiddleware(view)(request)
+        return routed[0], response
+
+    def test_reads_go_to_replica(self):
+        database, response = self.handle()
+        self.assertEqual(database, 'replica1')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+    def test_replica_is_chosen_once_per_request(self):
+        """Все чтения одного запроса идут в одну реплику."""
+        def view(request):
+            routed = {router.db_for_read(Post) for _ in range(20)}
+            self.assertEqual(len(routed), 1)
+            return HttpResponse()
+
+        ReplicaMiddleware(view)(RequestFactory().get('/'))
+
+    def test_writes_pin_to_primary(self):
+        """Запрос с записью читает с основной базы и ставит cookie."""
+        database, response = self.handle('post', write=True)
+        self.assertEqual(database, 'default')
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+        database, response = self.handle(cookies={PIN_COOKIE: '1'})
+        self.assertEqual(database, 'default')
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(router.db_for_read(Post), 'default')
+        with db_router.use_primary():
+            self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(router.db_for_write(Post), 'default')
+
+    def test_primary_block_inside_request(self):
+        """Запись внутри use_primary() тоже закрепляет браузер за основной."""
+        def view(request):
+            with db_router.use_primary():
+                self.assertEqual(router.db_for_read(Post), 'default')
+                router.db_for_write(Post)
+            self.assertEqual(router.db_for_read(Post), 'replica1')
+            return HttpResponse()
+
+        response = ReplicaMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
@@ -0,0 +1,106 @@
+import re
+from copy import deepcopy
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Job, Post
+from .. import instrumentation
+
+User = get_user_model()
+
+
+LOADERS = [('django.template.loaders.cached.Loader', [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+])]
+
+
+def templates_with(loaders):
+    templates = deepcopy(settings.TEMPLATES)
+    templates[0]['OPTIONS']['loaders'] = loaders
+    return templates
+
+
+class InstrumentationMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        instrumentation.reset()
+        self.client = Client()
+
+    def test_server_timing_header(self):
+        """Ответ представления несёт заголовок Server-Timing."""
+        response = self.client.get(reverse('index'))
+        timing = response['Server-Timing']
+        for metric in ('view;dur=', 'sql;desc=', 'tpl;dur=', 'cache;desc='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, timing)
+
+    @override_settings(QUERY_BUDGET=0)
+    def test_query_budget_is_logged(self):
+        """Превышение бюджета запросов попадает в лог."""
+        with self.assertLogs('yatube.performance', 'WARNING') as logs:
+            self.client.get(reverse('index'))
+        self.assertIn('posts.views.index', logs.output[0])
+
+    def test_eager_jobs_are_outside_budget(self):
+        """SQL задач JOBS_EAGER не входит в счётчик представления.
+
+        Без очереди запрос отличается от обычного только тем, что не
+        вставляет строки Job.
+        """
+        author = User.objects.create_user(username='Writer')
+        self.client.force_login(author)
+        counts = []
+        for eager in (False, True):
+            with override_settings(JOBS_EAGER=eager):
+                response = self.client.post(
+                    reverse('new_post'), {'text': f'Пост {eager}'})
+            counts.append(int(re.search(
+                r'sql;desc="(\d+) queries"',
+                response['Server-Timing']).group(1)))
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(counts[1], counts[0] - Job.objects.count())
+
+    def test_metrics_endpoint(self):
+        """Гистограммы доступны только персоналу."""
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+        admin = User.objects.create_user(username='admin', is_staff=True)
+        self.client.force_login(admin)
+        data = self.client.get(reverse('metrics')).json()
+        self.assertEqual(data['views']['posts.views.index']['count'], 1)
+        self.assertIn('feed_page', data['cache'])
+
+
+class TemplateProfilingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        instrumentation.reset()
+
+    def test_templates_are_profiled(self):
+        """С ProfilingLoader видно время каждого шаблона страницы."""
+        author = User.objects.create_user(username='Writer')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=author) for number in range(3))
+        loaders = [('yatube.template_backends.ProfilingLoader', LOADERS)]
+        with override_settings(TEMPLATES=templates_with(loaders)):
+            response = Client().get(reverse('index'))
+        self.assertContains(response, 'Пост 2')
+        templates = instrumentation.histograms()['posts.views.index'][
+            'templates']
+        self.assertEqual(templates['includes/post_item.html']['count'], 3)
+        for name in ('index.html', 'base.html', 'includes/paginator.html'):
+            with self.subTest(name=name):
+                self.assertGreater(templates[name]['ms_per_request'], 0)
+
+    def test_templates_are_not_profiled_by_default(self):
+        with override_settings(TEMPLATES=templates_with(LOADERS)):
+            Client().get(reverse('index'))
+        self.assertEqual(
+            instrumentation.histograms()['posts.views.index']['templates'],
+            {})
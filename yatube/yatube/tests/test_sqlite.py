@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..sqlite.transaction import atomic_write
+
+
+class SqliteBackendTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied(self):
+        """Каждое соединение получает PRAGMA из профиля."""
+        pragmas = settings.SQLITE_PRAGMAS
+        if not pragmas:
+            self.skipTest('Профиль SQLite без PRAGMA')
+        self.assertEqual(self.pragma('busy_timeout'), pragmas['busy_timeout'])
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), pragmas['cache_size'])
+
+
+class ImmediateTransactionTest(TransactionTestCase):
+    def begin_statement(self, atomic=atomic_write):
+        with CaptureQueriesContext(connection) as queries:
+            with atomic():
+                pass
+        return queries[0]['sql']
+
+    @override_settings(SQLITE_IMMEDIATE_TRANSACTIONS=True)
+    def test_immediate_transactions(self):
+        """BEGIN IMMEDIATE — только для пишущих транзакций."""
+        self.assertEqual(self.begin_statement(), 'BEGIN IMMEDIATE')
+        self.assertEqual(self.begin_statement(transaction.atomic), 'BEGIN')
+        self.assertEqual(self.begin_statement(), 'BEGIN IMMEDIATE')
+
+    @override_settings(SQLITE_IMMEDIATE_TRANSACTIONS=False)
+    def test_deferred_transactions(self):
+        self.assertEqual(self.begin_statement(), 'BEGIN')
+
+    @override_settings(SQLITE_IMMEDIATE_TRANSACTIONS=True)
+    def test_decorator(self):
+        @atomic_write
+        def write():
+            return connection.in_atomic_block
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(write())
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
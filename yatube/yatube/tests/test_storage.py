@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from ..storage import BLOBS, ContentAddressedStorage
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def save(self, name, content):
+        return self.storage.save(name, ContentFile(content))
+
+    def test_same_content_is_stored_once(self):
+        first = self.save('posts/meme.jpg', b'meme')
+        second = self.save('posts/meme.jpg', b'meme')
+        other = self.save('posts/other.jpg', b'other')
+        self.assertEqual(first, 'posts/meme.jpg')
+        self.assertNotEqual(second, first)
+        self.assertTrue(os.path.samefile(self.storage.path(first),
+                                         self.storage.path(second)))
+        self.assertFalse(os.path.samefile(self.storage.path(first),
+                                          self.storage.path(other)))
+        digest = self.storage.digest(first)
+        self.assertEqual(self.storage.refcount(digest), 2)
+        with self.storage.open(second) as file:
+            self.assertEqual(file.read(), b'meme')
+
+    def test_garbage_collection(self):
+        """Blob удаляется, когда на него не осталось имён."""
+        names = [self.save('meme.jpg', b'meme') for _ in range(2)]
+        digest = self.storage.digest(names[0])
+        self.storage.delete(names[0])
+        self.assertEqual(self.storage.collect_garbage(), 0)
+        self.assertEqual(self.storage.refcount(digest), 1)
+        self.storage.delete(names[1])
+        self.assertEqual(self.storage.collect_garbage(), 1)
+        self.assertFalse(self.storage.exists(self.storage.blob_name(digest)))
+
+    def test_dedupe_command(self):
+        """Файлы, сохранённые мимо хранилища, сводятся к одному blob."""
+        os.makedirs(os.path.join(self.location, 'posts'))
+        for name in ('a.gif', 'b.gif', 'c.gif'):
+            with open(os.path.join(self.location, 'posts', name), 'wb') as f:
+                f.write(b'same' if name != 'c.gif' else b'unique')
+        with override_settings(MEDIA_ROOT=self.location):
+            out = StringIO()
+            call_command('dedupe_media', dry_run=True, stdout=out)
+            self.assertIn('Файлов: 3, уникальных: 2, дубликаты занимают: 4',
+                          out.getvalue())
+            call_command('dedupe_media', stdout=out)
+            call_command('dedupe_media', dry_run=True, stdout=out)
+        self.assertIn('освобождено: 4 Б', out.getvalue())
+        self.assertIn('дубликаты занимают: 0', out.getvalue())
+        self.assertTrue(os.path.samefile(
+            os.path.join(self.location, 'posts', 'a.gif'),
+            os.path.join(self.location, 'posts', 'b.gif')))
+        blobs = sum(len(files) for _, _, files in
+                    os.walk(os.path.join(self.location, BLOBS)))
+        self.assertEqual(blobs, 2)
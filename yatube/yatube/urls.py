@@ -4,13 +4,17 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from . import views
+
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
 
 urlpatterns = [
+    path('admin/metrics/', views.metrics, name='metrics'),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('api/v1/', include('posts.api_urls', namespace='api')),
     path('', include('posts.urls')),
     path('about/', include('about.urls', namespace='about')),
 ]
@@ -0,0 +1,12 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+
+from . import cache, instrumentation
+
+
+@staff_member_required
+def metrics(request):
+    return JsonResponse({
+        'views': instrumentation.histograms(),
+        'cache': cache.stats(),
+    }, json_dumps_params={'ensure_ascii': False, 'indent': 2})